@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 """
-Use {AS_ROLE} to run a command after assuming a destination profile's
-role_arn via its source_profile as specified by {PROFILE_PATH}. This can
-be helpful for tools that don't implement cross-profile roles but do
+Run a command after assuming a destination profile's role_arn via its
+source_profile as specified by {CONFIG_PATH} or {PROFILE_PATH}, using
+and updating the same credential cache as {AS_ROLE}. This can be
+helpful for tools that don't implement cross-profile roles but do
 understand AWS_ACCESS_KEY_ID/AWS_SECRET_ACCESS_KEY/AWS_SESSION_TOKEN
 environment variables.
 
@@ -20,30 +21,76 @@ You must have an {PROFILE_PATH} similar to this:
 Here, the "organization" profile has credentials with permission to
 assume the role specified by the destination "production" profile. While
 mfa_serial is optional, both role_arn and source_profile must be
-specified on the destination profile. This script does not support
-credential_source on the destination profile; only source_profile is
-supported.
+specified on the destination profile. The source_profile may itself have
+a role_arn and source_profile, in which case each role in the chain is
+assumed in turn, with every hop cached. Profiles can also be written in
+{CONFIG_PATH} as [profile production] sections. This script does not
+support credential_source; only source_profile is supported.
 """
 
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 AS_ROLE = "aws-as-role"
+CONFIG_PATH = "~/.aws/config"
 PROFILE_PATH = "~/.aws/credentials"
 
+# Credentials for the intermediate hops of a role chain only need to last
+# long enough to assume the next role in the chain.
+HOP_NEED_SECONDS = 60
+
+ProfileConfig = Dict[str, Dict[str, str]]
+
 
 def main():
-    args = get_parser().parse_args()
+    from functools import partial
+    from os import environ
+    from sys import stderr
+
+    from lib.aws.credentials import get_credential_caches
+    from lib.aws.spawn import do_fan_out, do_spawn
+
+    parser = get_parser()
+    args = parser.parse_args()
+    profiles = args.profile or [environ["AWS_PROFILE"].strip()]
+    if len(set(profiles)) < len(profiles):
+        parser.error("--profile can only be given once per profile")
     profile_config = get_profile_config()
-    destination_config = profile_config[args.profile]
-    as_role_command = get_as_role_command(
-        source_profile=destination_config["source_profile"],
-        destination_role_arn=destination_config["role_arn"],
+    try:
+        chains = {
+            profile: get_profile_chain(profile_config, profile)
+            for profile in profiles
+        }
+    except ValueError as error:
+        parser.error(str(error))
+
+    get_credentials = partial(
+        get_chain_credentials,
+        credential_caches=get_credential_caches(prog=AS_ROLE),
+        profile_config=profile_config,
         session_name=args.session_name,
-        serial_number=destination_config.get("mfa_serial"),
-        duration_seconds=args.duration_seconds,
-        command=args.command,
+        need_seconds=args.duration_seconds,
+    )
+    command = args.command or [environ["SHELL"]]
+
+    if len(chains) > 1:
+        return do_fan_out(
+            get_credentials_by_label={
+                profile: partial(get_credentials, chain=chain)
+                for profile, chain in chains.items()
+            },
+            command=command,
+            jobs=args.jobs,
+        )
+
+    chain = chains[profiles[0]]
+    print(" -> ".join(reversed(chain)), file=stderr)  # inform user of hops
+    credentials = get_credentials(chain=chain)
+    do_spawn(
+        access_key_id=credentials["AccessKeyId"],
+        secret_access_key=credentials["SecretAccessKey"],
+        session_token=credentials["SessionToken"],
+        command=command,
     )
-    do_spawn(as_role_command)
 
 
 def get_parser():
@@ -59,27 +106,31 @@ def get_parser():
 
     profile_help = """
         destination profile with the role_arn you want to assume using its
-        source_profile
+        source_profile; can be repeated to run your command once per profile
+        (see --jobs)
     """.strip()
-    try:
-        default_profile = environ["AWS_PROFILE"].strip()
-        assert len(default_profile) > 0
-        parser.add_argument(
-            "--profile",
-            default=default_profile,
-            help=f'{profile_help}; defaults to your AWS_PROFILE "%(default)s"',
-        )
-    except (KeyError, AssertionError):
-        parser.add_argument(
-            "--profile",
-            required=True,
-            help=f"{profile_help}; you must set this",
-        )
+    default_profile = environ.get("AWS_PROFILE", "").strip()
+    parser.add_argument(
+        "--profile",
+        action="append",
+        required=not default_profile,
+        help=(
+            f'{profile_help}; defaults to your AWS_PROFILE "{default_profile}"'
+            if default_profile
+            else f"{profile_help}; you must set this"
+        ),
+    )
 
-    passed_help = f"passed thru to {AS_ROLE}"
-    parser.add_argument("--session-name", help=passed_help)
-    parser.add_argument("--duration-seconds", help=passed_help)
-    parser.add_argument("command", nargs="*", help=passed_help)
+    same_help = f"same as {AS_ROLE}"
+    parser.add_argument("--session-name", help=same_help)
+    parser.add_argument(
+        "--duration-seconds",
+        help=same_help,
+        default=600,
+        type=int,
+    )
+    parser.add_argument("--jobs", help=same_help, default=4, type=int)
+    parser.add_argument("command", nargs="*", help=same_help)
 
     return parser
 
@@ -111,49 +162,93 @@ def get_parser_help() -> Tuple[str, str]:
     return description, "\n\n".join(epilog_blocks)
 
 
-def get_profile_config():
+def get_profile_config() -> ProfileConfig:
+    """
+    Returns settings for each profile found in either file, where those
+    from PROFILE_PATH win out over CONFIG_PATH as they do for the CLI.
+    """
+
     from configparser import ConfigParser
     from os.path import expanduser
 
-    profile_path = expanduser(PROFILE_PATH)
-    profile_config = ConfigParser()
-    profile_config.read(profile_path)
+    profile_config: ProfileConfig = {}
+    for path in [CONFIG_PATH, PROFILE_PATH]:
+        parser = ConfigParser()
+        parser.read(expanduser(path))
+        for section in parser.sections():
+            profile = (
+                section.split(" ", 1)[1].strip()
+                if path == CONFIG_PATH and section.startswith("profile ")
+                else section
+            )
+            profile_config.setdefault(profile, {}).update(parser[section])
+
     return profile_config
 
 
-def get_as_role_command(
-    source_profile: str,
-    destination_role_arn: str,
-    session_name: Optional[str],
-    serial_number: Optional[str],
-    duration_seconds: Optional[str],
-    command: List[str],
-):
-    as_role_command = ["aws-as-role"]
-    as_role_command.extend(["--profile", source_profile])
-    as_role_command.extend(["--role-arn", destination_role_arn])
+def get_profile_chain(profile_config: ProfileConfig, profile: str):
+    """
+    Returns the destination profile followed by each of the source
+    profiles needed to get to it, ending with one that has credentials
+    of its own (i.e. no role_arn).
+    """
 
-    if session_name:
-        as_role_command.extend(["--session-name", session_name])
-    if serial_number:
-        as_role_command.extend(["--serial-number", serial_number])
-    if duration_seconds:
-        as_role_command.extend(["--duration-seconds", duration_seconds])
-    if command:
-        as_role_command.extend(["--", *command])
+    chain = [profile]
+    while True:
+        try:
+            config = profile_config[chain[-1]]
+        except KeyError:
+            raise ValueError(f'profile "{chain[-1]}" is not configured')
 
-    return as_role_command
+        if "role_arn" not in config:
+            break
+        elif "source_profile" not in config:
+            raise ValueError(f'profile "{chain[-1]}" needs a source_profile')
+        elif config["source_profile"] in chain:
+            raise ValueError(f'profile "{chain[-1]}" has a cyclic role chain')
+        chain.append(config["source_profile"])
 
+    if len(chain) == 1:
+        raise ValueError(f'profile "{profile}" has no role_arn')
+
+    return chain
 
-def do_spawn(command: List[str]):
-    from shlex import quote
-    from subprocess import run
-    from sys import stderr
 
-    print(*map(quote, command), file=stderr)  # inform user what we're doing
-    print(file=stderr)
-    run(command)
+def get_chain_credentials(
+    chain: List[str],
+    credential_caches: list,
+    profile_config: ProfileConfig,
+    session_name: Optional[str],
+    need_seconds: int,
+):
+    from lib.aws.credentials import get_role_credentials
+
+    profile, source_profile, *_ = chain
+    config = profile_config[profile]
+
+    return get_role_credentials(
+        credential_caches=credential_caches,
+        need_seconds=need_seconds,
+        profile=source_profile,
+        role_arn=config["role_arn"],
+        session_name=(
+            session_name or config.get("role_session_name") or AS_ROLE
+        ),
+        serial_number=config.get("mfa_serial", ""),
+        duration_seconds=need_seconds,
+        get_source_credentials=(
+            None
+            if len(chain) == 2  # source_profile has credentials of its own
+            else lambda: get_chain_credentials(
+                credential_caches=credential_caches,
+                profile_config=profile_config,
+                chain=chain[1:],
+                session_name=session_name,
+                need_seconds=HOP_NEED_SECONDS,
+            )
+        ),
+    )
 
 
 if __name__ == "__main__":
-    main()
+    exit(main())
@@ -7,35 +7,94 @@ from the AWS Security Token Service (STS) for the given role.
 """
 
 from os import environ
-from typing import Dict, List, TypedDict, cast
+from typing import Dict, List
 
-# IAM roles always allow at least one hour, so when a token does have to
-# be requested, ask for an hour to increase the likelihood that a future
-# aws-as-role invocation will be able to re-use the token. The user can
-# push this higher with `--duration-seconds`, but otherwise use an hour.
-MIN_DURATION_REQUEST = 3600
+from lib.aws.credentials import (
+    MIN_DURATION_REQUEST,
+    CredentialCache,
+    StsCredentials,
+    get_credential_caches,
+    get_role_credentials,
+)
+from lib.aws.spawn import do_fan_out, do_spawn
+
+# SDKs using a credential_process ask for credentials again once the ones
+# they have are within 15 minutes of expiring (botocore's advisory refresh
+# window), so hand them tokens with more time left than that.
+CREDENTIAL_PROCESS_MIN_SECONDS = 15 * 60 + 60
 
 
 def main():
-    from time import time
+    from functools import partial
 
     parser = get_parser()
     args = parser.parse_args()
-    credential_cache = get_credential_cache(prog=parser.prog)
-    cache_key = get_cache_key(args.role_arn)
-    need_credentials_until = time() + args.duration_seconds
-
-    try:
-        credentials = credential_cache[cache_key]
-        assert need_credentials_until <= credentials["Expiration"]
-    except (KeyError, AssertionError):
-        credential_cache[cache_key] = credentials = get_credentials(
+    if not (args.command or args.keep_fresh or args.credential_process):
+        parser.error("give a command to run, as SHELL is not set")
+    credential_caches = get_credential_caches(prog=parser.prog)
+
+    if args.keep_fresh:
+        need_seconds = get_keep_fresh_need_seconds(
+            args.duration_seconds, args.keep_fresh
+        )
+        if need_seconds >= max(args.duration_seconds, MIN_DURATION_REQUEST):
+            parser.error(
+                f"--keep-fresh {args.keep_fresh} is too long for fresh tokens"
+                f" to last --duration-seconds {args.duration_seconds} past"
+                " the next check; use a shorter interval"
+            )
+
+        do_keep_fresh(
+            credential_caches=credential_caches,
+            interval=args.keep_fresh,
             profile=args.profile,
-            role_arn=args.role_arn,
+            role_arns=args.role_arn,
             session_name=args.session_name,
             serial_number=args.serial_number,
-            duration_seconds=max(args.duration_seconds, MIN_DURATION_REQUEST),
+            duration_seconds=args.duration_seconds,
         )
+        return
+    elif len(args.role_arn) > 1:
+        if args.credential_process:
+            parser.error("--credential-process needs exactly one --role-arn")
+        elif len(set(args.role_arn)) < len(args.role_arn):
+            parser.error("--role-arn can only be given once per role")
+
+        get_credentials = partial(
+            get_role_credentials,
+            credential_caches=credential_caches,
+            need_seconds=args.duration_seconds,
+            profile=args.profile,
+            session_name=args.session_name,
+            serial_number=args.serial_number,
+            duration_seconds=args.duration_seconds,
+        )
+        return do_fan_out(
+            get_credentials_by_label={
+                label: partial(get_credentials, role_arn=role_arn)
+                for role_arn, label in get_role_labels(args.role_arn).items()
+            },
+            command=args.command,
+            jobs=args.jobs,
+        )
+
+    credentials = get_role_credentials(
+        credential_caches=credential_caches,
+        need_seconds=(
+            max(args.duration_seconds, CREDENTIAL_PROCESS_MIN_SECONDS)
+            if args.credential_process
+            else args.duration_seconds
+        ),
+        profile=args.profile,
+        role_arn=args.role_arn[0],
+        session_name=args.session_name,
+        serial_number=args.serial_number,
+        duration_seconds=args.duration_seconds,
+    )
+
+    if args.credential_process:
+        do_print_credential_process(credentials)
+        return
 
     do_spawn(
         access_key_id=credentials["AccessKeyId"],
@@ -48,7 +107,7 @@ def main():
 def get_parser():
     from argparse import ArgumentParser
 
-    # if changing this interface, review aws-as-profile's usage of aws-as-role
+    # aws-as-profile's interface mirrors this one, so review it if changing
     assert isinstance(__doc__, str), "expecting module-level docstring"
     description, epilog = __doc__.split("\n\n")
     parser = ArgumentParser(description=description, epilog=epilog)
@@ -63,8 +122,11 @@ def get_parser():
         "--role-arn",
         help="""
             full ARN of the role you need to assume, e.g.
-            arn:aws:iam::123456789012:role/OrganizationAccountAccessRole
+            arn:aws:iam::123456789012:role/OrganizationAccountAccessRole; can
+            be repeated to run your command once per role (see --jobs) or to
+            keep several roles fresh (see --keep-fresh)
         """,
+        action="append",
         required=True,
     )
     parser.add_argument(
@@ -101,6 +163,41 @@ def get_parser():
             are assuming must be configured to allow a longer session duration)
         """,
     )
+    parser.add_argument(
+        "--keep-fresh",
+        type=int,
+        metavar="SECONDS",
+        help="""
+            instead of running a command, keep running and check the cached
+            tokens for each --role-arn every SECONDS seconds, requesting fresh
+            ones from STS well before fewer than --duration-seconds remain, so
+            that other %(prog)s invocations never need to wait on STS; if using
+            --serial-number, run this in a terminal of its own so that it can
+            prompt you for MFA codes
+        """,
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=4,
+        metavar="COUNT",
+        help="""
+            when --role-arn is repeated, run your command for up to this many
+            roles at a time, prefixing each line of output with the role's
+            account; defaults to %(default)s
+        """,
+    )
+    parser.add_argument(
+        "--credential-process",
+        help="""
+            instead of running a command, print the credentials as JSON for
+            use as a credential_process in ~/.aws/config, e.g. a profile with
+            "credential_process = aws-as-role --credential-process --profile
+            organization --role-arn arn:aws:iam::123456789012:role/Admin" lets
+            AWS SDKs get (and later refresh) tokens through %(prog)s's cache
+        """,
+        action="store_true",
+    )
     parser.add_argument(
         "command",
         nargs="*",
@@ -109,106 +206,102 @@ def get_parser():
             assuming the role; if unspecified, defaults to your shell, which is
             currently %(default)s
         """,
-        default=[environ["SHELL"]],
+        default=[environ["SHELL"]] if "SHELL" in environ else [],
     )
 
     return parser
 
 
-class StsCredentials(TypedDict):
-    AccessKeyId: str
-    SecretAccessKey: str
-    SessionToken: str
-    Expiration: int
-
-
-def get_credential_cache(prog: str):
-    """
-    Returns a dict-like object for caching credentials on-disk. This is
-    similar to how the AWS CLI does things with `~/.aws/cli/cache/`, but
-    unfortunately stored at a different location such that neither tool
-    benefits from the other's cache.
-
-    There's another way to cache credentials by overriding the `cache`
-    attribute on the `assume-role` provider of the `credential_provider`
-    component (see <https://github.com/boto/botocore/pull/1157>), but
-    that cannot be leveraged here because
-
-    - we are the ones doing the call to `assume_role()` rather than it
-      being called for us by another AWS service client, and
-    - we want to be able to inspect the `Expiration` value of what we
-      have cached to make sure the caller has the requisite time left.
-    """
-
-    from appdirs import user_cache_dir
-    from botocore.utils import JSONFileCache
-
-    our_cache_dir = user_cache_dir(appname=prog)  # e.g. ~/.cache/aws-as-role/
-    credential_cache = JSONFileCache(working_dir=our_cache_dir)
-    return cast(Dict[str, StsCredentials], credential_cache)
-
-
-def get_cache_key(role_arn: str):
-    from hashlib import sha1
-
-    return sha1(role_arn.encode("utf-8")).hexdigest()
-
-
-def get_credentials(
+def do_keep_fresh(
+    credential_caches: List[CredentialCache],
+    interval: int,
     profile: str,
-    role_arn: str,
+    role_arns: List[str],
     session_name: str,
     serial_number: str,
     duration_seconds: int,
 ):
-    from getpass import getpass
+    from sys import stderr
+    from time import ctime, sleep
+
+    need_seconds = get_keep_fresh_need_seconds(duration_seconds, interval)
+    expirations: Dict[str, int] = {}
+
+    while True:
+        for role_arn in role_arns:
+            try:
+                credentials = get_role_credentials(
+                    credential_caches=credential_caches,
+                    need_seconds=need_seconds,
+                    profile=profile,
+                    role_arn=role_arn,
+                    session_name=session_name,
+                    serial_number=serial_number,
+                    duration_seconds=duration_seconds,
+                )
+            except KeyboardInterrupt:
+                return
+            except Exception as error:  # keep going; maybe a network blip
+                print(f"{role_arn}: {error}", file=stderr)
+            else:
+                expiration = credentials["Expiration"]
+                if expirations.get(role_arn) != expiration:
+                    expirations[role_arn] = expiration
+                    until = ctime(expiration)
+                    print(f"{role_arn}: cached until {until}", file=stderr)
+
+        try:
+            sleep(interval)
+        except KeyboardInterrupt:
+            return
+
+
+def get_keep_fresh_need_seconds(duration_seconds: int, interval: int) -> int:
+    # A foreground invocation needs duration_seconds left on the tokens, and
+    # the next check is up to an interval away, so refresh with an interval
+    # to spare on top of that to allow for a slow STS call or a late wakeup.
+    return duration_seconds + 2 * interval
+
+
+def do_print_credential_process(credentials: StsCredentials):
+    """
+    Prints credentials as described by "Sourcing credentials with an
+    external process" in the AWS CLI User Guide.
+    """
 
-    from boto3 import Session
+    from datetime import datetime, timezone
+    from json import dumps
 
-    session = Session(profile_name=profile)
-    sts = session.client("sts")
-    assume_role_args = dict(
-        RoleArn=role_arn,
-        RoleSessionName=session_name,
-        DurationSeconds=duration_seconds,
+    expiration = datetime.fromtimestamp(
+        credentials["Expiration"], timezone.utc
     )
-    if serial_number:
-        mfa_code = getpass(f"Enter MFA code for {serial_number}: ")
-        assume_role_args.update(SerialNumber=serial_number, TokenCode=mfa_code)
-
-    response = sts.assume_role(**assume_role_args)
-    credentials = dict(
-        response["Credentials"],
-        Expiration=response["Credentials"]["Expiration"].timestamp(),
+    output = dict(
+        Version=1,
+        AccessKeyId=credentials["AccessKeyId"],
+        SecretAccessKey=credentials["SecretAccessKey"],
+        SessionToken=credentials["SessionToken"],
+        Expiration=expiration.isoformat(),
     )
-    return cast(StsCredentials, credentials)
+    print(dumps(output))
 
 
-def do_spawn(
-    access_key_id: str,
-    secret_access_key: str,
-    session_token: str,
-    command: List[str],
-):
-    from subprocess import run
-
-    # copy current set of environment variables, but clear AWS_PROFILE if set
-    # so that the subprocess only sees the new credentials.
-    new_environ = dict(environ)
-    try:
-        del new_environ["AWS_PROFILE"]
-    except KeyError:
-        pass
-
-    # configure new credentials into environment
-    new_environ.update(
-        AWS_ACCESS_KEY_ID=access_key_id,
-        AWS_SECRET_ACCESS_KEY=secret_access_key,
-        AWS_SESSION_TOKEN=session_token,
-    )
+def get_role_labels(role_arns: List[str]) -> Dict[str, str]:
+    """
+    Returns the account ID for each role to label its output with, unless
+    the same account comes up more than once, in which case the role name
+    is needed too.
+    """
 
-    run(command, env=new_environ)
+    accounts = [role_arn.split(":")[4] for role_arn in role_arns]
+    return {
+        role_arn: (
+            account
+            if accounts.count(account) == 1
+            else role_arn.split(":", 4)[4]
+        )
+        for role_arn, account in zip(role_arns, accounts)
+    }
 
 
 if __name__ == "__main__":
-    main()
+    exit(main())
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 Given a Lambda function, display its environment variables or run a
-command with those environment variables set.
+command with those environment variables set, or export the environment
+variables of many Lambda functions at once.
 
 Note that any command run will be using the AWS credentials of the user
 invoking the script (or no credentials at all if --no-auth-env is used);
@@ -10,18 +11,78 @@ invocation of the Lambda function.
 """
 
 from sys import stderr
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, cast
 
 from boto3 import Session
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+# The subset of a function's configuration that this script makes use of,
+# which is all that gets cached.
+CONFIG_KEYS = ["FunctionName", "Runtime", "MemorySize", "Environment"]
+
+# Most API calls to resolve --resolve-references values can ask for this many
+# parameters (GetParameters) or secrets (BatchGetSecretValue) at once.
+BATCH_SIZES = {"ssm": 10, "secretsmanager": 20}
+
+NamedVars = Tuple[str, Dict[str, str]]
 
 
 def main():
     from shlex import quote
     from subprocess import run
 
-    args = get_parser().parse_args()
+    parser = get_parser()
+    args = parser.parse_args()
     session = Session(profile_name=args.profile, region_name=args.region)
-    vars = get_lambda_vars(session, args.function_name)
-    vars_quoted = ("=".join(map(quote, pair)) for pair in vars.items())
+    config_cache = get_config_cache(prog=parser.prog)
+
+    if not args.function_name:
+        if args.command:
+            parser.error("commands can only be run with --function-name")
+        configs = get_lambda_configs(
+            session=session,
+            config_cache=config_cache,
+            prefix=args.function_name_prefix,
+            tags=args.tag,
+            names_path=args.function_names_from,
+            max_age=args.max_age,
+            jobs=args.jobs,
+        )
+        named_vars: Iterable[NamedVars] = (
+            (config["FunctionName"], get_lambda_vars(session, config))
+            for config in configs
+        )
+        if args.resolve_references:  # needs all references up front to batch
+            named_vars = get_resolved_vars(
+                session=session,
+                reference_cache=get_reference_cache(
+                    parser.prog, args.reference_max_age
+                ),
+                named_vars=list(named_vars),
+                max_age=args.reference_max_age,
+                jobs=args.jobs,
+            )
+        write_bulk_output(named_vars, output_dir=args.output_dir)
+        return
+
+    config = get_lambda_config(
+        session=session,
+        config_cache=config_cache,
+        function_name=args.function_name,
+        max_age=args.max_age,
+    )
+    vars = get_lambda_vars(session, config)
+    if args.resolve_references:
+        [(_, vars)] = get_resolved_vars(
+            session=session,
+            reference_cache=get_reference_cache(
+                parser.prog, args.reference_max_age
+            ),
+            named_vars=[(args.function_name, vars)],
+            max_age=args.reference_max_age,
+            jobs=args.jobs,
+        )
+    vars_quoted = get_dotenv_lines(vars)
 
     if args.command:
         # display shell-safe copy-and-pasteable rendition of what we're doing
@@ -57,10 +118,88 @@ def get_parser():
         "--region",
         help="region where Lambda function is provisioned",
     )
-    parser.add_argument(
+    selection = parser.add_mutually_exclusive_group(required=True)
+    selection.add_argument(
         "--function-name",
         help="provisioned name of the Lambda function",
-        required=True,
+    )
+    selection.add_argument(
+        "--function-name-prefix",
+        help="""
+            export every Lambda function whose name starts with this prefix;
+            the listing of functions already includes their configuration, so
+            this needs no further lookups
+        """,
+        metavar="PREFIX",
+    )
+    selection.add_argument(
+        "--tag",
+        help="""
+            export every Lambda function tagged with KEY=VALUE (or with KEY
+            at all); can be repeated to require several tags
+        """,
+        action="append",
+        metavar="KEY=VALUE",
+    )
+    selection.add_argument(
+        "--function-names-from",
+        help="""
+            export every Lambda function named in this file, one per line
+        """,
+        metavar="PATH",
+    )
+    parser.add_argument(
+        "--output-dir",
+        help="""
+            when exporting many functions, write a NAME.env file into this
+            directory for each rather than a JSON object of all of them to
+            stdout
+        """,
+        metavar="DIR",
+    )
+    parser.add_argument(
+        "--jobs",
+        help="""
+            when exporting many functions or resolving references, make this
+            many API calls at a time; default is %(default)s
+        """,
+        default=8,
+        metavar="COUNT",
+        type=int,
+    )
+    parser.add_argument(
+        "--resolve-references",
+        help="""
+            replace values that refer to SSM parameters (e.g.
+            "ssm:/app/db/password" or a parameter ARN) or to Secrets Manager
+            secrets (a secret ARN) with what they refer to, like a function
+            resolving them at cold start would; references are fetched in
+            batches and cached on-disk for --reference-max-age
+        """,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--reference-max-age",
+        help="""
+            seconds to reuse values fetched by --resolve-references for, after
+            which they are deleted from disk; 0 never writes them to disk;
+            default is %(default)s
+        """,
+        default=300,
+        metavar="SECONDS",
+        type=float,
+    )
+    parser.add_argument(
+        "--max-age",
+        help="""
+            reuse the function configuration cached by an earlier run without
+            asking Lambda about it if the cached copy is no older than this
+            many seconds, e.g. for working offline; by default, the cached copy
+            is only used if Lambda cannot be reached
+        """,
+        default=0,
+        metavar="SECONDS",
+        type=float,
     )
     parser.add_argument(
         "--no-local-env",
@@ -88,10 +227,410 @@ def get_parser():
     return parser
 
 
-def get_lambda_vars(session: Session, function_name: str):
-    awslambda = session.client("lambda")
-    response = awslambda.get_function(FunctionName=function_name)
-    config = response["Configuration"]
+def get_config_cache(prog: str):
+    """
+    Returns a dict-like object for caching function configurations, e.g.
+    in ~/.cache/aws-lambda-env/. Since environment variables might hold
+    secrets, note that botocore's JSONFileCache writes with 0600 mode.
+    """
+
+    from appdirs import user_cache_dir
+    from botocore.utils import JSONFileCache
+
+    our_cache_dir = user_cache_dir(appname=prog)
+    return cast(Dict[str, dict], JSONFileCache(working_dir=our_cache_dir))
+
+
+def get_reference_cache(prog: str, max_age: float):
+    """
+    Returns a dict-like object for caching resolved references, e.g. in
+    ~/.cache/aws-lambda-env/references/, after deleting any entries older
+    than max_age. These are plaintext secrets, so unlike configurations,
+    they are kept apart and never left on disk once they are too old to
+    be used.
+    """
+
+    from glob import glob
+    from os import remove
+    from os.path import getmtime, join
+    from time import time
+
+    from appdirs import user_cache_dir
+    from botocore.utils import JSONFileCache
+
+    our_cache_dir = join(user_cache_dir(appname=prog), "references")
+    for cache_file in glob(join(our_cache_dir, "*.json")):
+        try:
+            if time() - getmtime(cache_file) > max_age:
+                remove(cache_file)
+        except FileNotFoundError:  # removed by a concurrent run
+            pass
+
+    return cast(Dict[str, dict], JSONFileCache(working_dir=our_cache_dir))
+
+
+def get_lambda_config(
+    session: Session,
+    config_cache: Dict[str, dict],
+    function_name: str,
+    max_age: float,
+    awslambda=None,
+) -> dict:
+    """
+    Returns the function's configuration from the cache if it is recent
+    enough or from Lambda otherwise. GetFunctionConfiguration is used
+    rather than GetFunction, which also presigns a code download URL.
+
+    Lambda has no way to ask only whether a function changed, so each
+    refresh is one GetFunctionConfiguration call; its RevisionId is kept
+    with the cached copy so that changes can be reported.
+    """
+
+    from time import time
+
+    cache_key = get_config_cache_key(session, function_name)
+
+    try:
+        cached = config_cache[cache_key]
+    except KeyError:
+        cached = None
+    if cached and time() - cached["Timestamp"] <= max_age:
+        return cached["Configuration"]
+
+    awslambda = awslambda or session.client("lambda")
+    try:
+        response = awslambda.get_function_configuration(
+            FunctionName=function_name
+        )
+    except EndpointConnectionError:
+        if not cached:
+            raise
+        print(
+            f"warning: using cached configuration of {function_name} "
+            "because Lambda could not be reached",
+            file=stderr,
+        )
+        return cached["Configuration"]
+
+    if cached and cached["RevisionId"] != response["RevisionId"]:
+        print(f"note: {function_name} changed since last run", file=stderr)
+    return set_cached_config(config_cache, cache_key, response)
+
+
+def get_config_cache_key(session: Session, function_name: str):
+    from hashlib import sha1
+    from json import dumps
+
+    key = [*get_credentials_key(session), session.region_name, function_name]
+    return sha1(dumps(key).encode("utf-8")).hexdigest()
+
+
+def get_credentials_key(session: Session) -> List[Optional[str]]:
+    """
+    Returns what tells apart whose credentials a session uses without an
+    STS call. Credentials from the environment (e.g. under aws-as-role)
+    always report the "default" profile, so those are told apart by their
+    access key ID.
+    """
+
+    credentials = session.get_credentials()
+    access_key_id = (
+        credentials.access_key
+        if credentials and credentials.method == "env"
+        else None
+    )
+    return [session.profile_name, access_key_id]
+
+
+def get_reference_cache_key(session: Session, reference: str):
+    """
+    Returns where to cache a resolved reference. "ssm:" references are
+    only names, so the same one can mean different parameters in another
+    account or region.
+    """
+
+    from hashlib import sha1
+    from json import dumps
+
+    key = [*get_credentials_key(session), session.region_name, reference]
+    return sha1(dumps(key).encode("utf-8")).hexdigest()
+
+
+def set_cached_config(
+    config_cache: Dict[str, dict],
+    cache_key: str,
+    response: dict,
+) -> dict:
+    from time import time
+
+    config = {key: response[key] for key in CONFIG_KEYS if key in response}
+    config_cache[cache_key] = dict(
+        Timestamp=time(),
+        RevisionId=response["RevisionId"],
+        Configuration=config,
+    )
+    return config
+
+
+def get_lambda_configs(
+    session: Session,
+    config_cache: Dict[str, dict],
+    prefix: Optional[str],
+    tags: Optional[List[str]],
+    names_path: Optional[str],
+    max_age: float,
+    jobs: int,
+) -> Iterator[dict]:
+    """
+    Yields configurations for many functions as they become available.
+    A prefix is served straight from ListFunctions, whose results include
+    each function's configuration; otherwise, the functions are looked
+    up concurrently (and through the cache) after finding their names.
+    """
+
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    awslambda = session.client("lambda")  # unlike sessions, thread-safe
+
+    if prefix:
+        paginator = awslambda.get_paginator("list_functions")
+        for page in paginator.paginate():
+            for response in page["Functions"]:
+                function_name = response["FunctionName"]
+                if function_name.startswith(prefix):
+                    cache_key = get_config_cache_key(session, function_name)
+                    yield set_cached_config(config_cache, cache_key, response)
+        return
+
+    function_names = (
+        get_tagged_function_names(session, tags)
+        if tags
+        else get_listed_function_names(names_path) if names_path else []
+    )
+
+    def get_config(function_name: str) -> Optional[dict]:
+        try:
+            return get_lambda_config(
+                session=session,
+                config_cache=config_cache,
+                function_name=function_name,
+                max_age=max_age,
+                awslambda=awslambda,
+            )
+        except ClientError as error:
+            print(f"warning: skipping {function_name}: {error}", file=stderr)
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        futures = [
+            executor.submit(get_config, name) for name in function_names
+        ]
+        for future in as_completed(futures):
+            if config := future.result():
+                yield config
+
+
+def get_tagged_function_names(session: Session, tags: List[str]):
+    tagging = session.client("resourcegroupstaggingapi")
+    paginator = tagging.get_paginator("get_resources")
+    tag_filters = [
+        dict(Key=key, Values=[value]) if value else dict(Key=key)
+        for key, _, value in (tag.partition("=") for tag in tags)
+    ]
+
+    for page in paginator.paginate(
+        ResourceTypeFilters=["lambda:function"],
+        TagFilters=tag_filters,
+    ):
+        for resource in page["ResourceTagMappingList"]:
+            # arn:aws:lambda:REGION:ACCOUNT:function:NAME
+            yield resource["ResourceARN"].split(":")[6]
+
+
+def get_listed_function_names(path: str):
+    with open(path) as input:
+        for line in input:
+            if (function_name := line.strip()) and function_name[0] != "#":
+                yield function_name
+
+
+def get_resolved_vars(
+    session: Session,
+    reference_cache: Dict[str, dict],
+    named_vars: List[NamedVars],
+    max_age: float,
+    jobs: int,
+) -> List[NamedVars]:
+    """
+    Returns the given variables with any SSM parameter or Secrets Manager
+    secret references replaced by their values. References are collected
+    across all functions so that each one is only fetched once, either
+    from the on-disk cache or in batches, with batches made concurrently.
+    References that cannot be resolved are left as they were.
+    """
+
+    from concurrent.futures import ThreadPoolExecutor
+    from time import time
+
+    resolved: Dict[str, str] = {}
+    wanted: Dict[Tuple[str, str], List[str]] = {}  # by (service, region)
+
+    for _, vars in named_vars:
+        for value in vars.values():
+            if value in resolved or not (kind := get_reference_kind(value)):
+                continue
+            cache_key = get_reference_cache_key(session, value)
+            try:
+                cached = reference_cache[cache_key]
+                if time() - cached["Timestamp"] > max_age:
+                    del reference_cache[cache_key]  # don't keep stale secrets
+                    raise KeyError(cache_key)
+                resolved[value] = cached["Value"]
+            except KeyError:
+                resolved[value] = value  # until fetched, also for de-duping
+                region = (
+                    value.split(":")[3]
+                    if value.startswith("arn:")
+                    else session.region_name
+                )
+                wanted.setdefault((kind, region), []).append(value)
+
+    batches = [
+        (kind, region, references[start : start + BATCH_SIZES[kind]])
+        for (kind, region), references in wanted.items()
+        for start in range(0, len(references), BATCH_SIZES[kind])
+    ]
+    clients = {
+        (kind, region): (
+            session.client("ssm", region_name=region)
+            if kind == "ssm"
+            else session.client("secretsmanager", region_name=region)
+        )
+        for kind, region in wanted
+    }
+
+    def fetch(kind: str, region: str, references: List[str]):
+        try:
+            return get_reference_values(
+                clients[kind, region], kind, references
+            )
+        except ClientError as error:
+            print(
+                f"warning: could not resolve references: {error}", file=stderr
+            )
+            return {}
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        for values in executor.map(lambda batch: fetch(*batch), batches):
+            for reference, value in values.items():
+                resolved[reference] = value
+                if max_age <= 0:
+                    continue
+                cache_key = get_reference_cache_key(session, reference)
+                reference_cache[cache_key] = dict(
+                    Timestamp=time(), Value=value
+                )
+
+    return [
+        (
+            name,
+            {key: resolved.get(value, value) for key, value in vars.items()},
+        )
+        for name, vars in named_vars
+    ]
+
+
+def get_reference_kind(value: str) -> Optional[str]:
+    from re import match
+
+    if value.startswith("ssm:"):
+        return "ssm"
+    elif match(r"arn:aws[\w-]*:ssm:.*:parameter/", value):
+        return "ssm"
+    elif match(r"arn:aws[\w-]*:secretsmanager:.*:secret:", value):
+        return "secretsmanager"
+    else:
+        return None
+
+
+def get_reference_values(client, kind: str, references: List[str]):
+    """
+    Fetches one batch of references with one API call, returning values
+    for those that could be found and warning about the rest.
+    """
+
+    values: Dict[str, str] = {}
+
+    if kind == "ssm":
+        names = {
+            reference.removeprefix("ssm:"): reference
+            for reference in references
+        }
+        response = client.get_parameters(
+            Names=list(names), WithDecryption=True
+        )
+        for parameter in response["Parameters"]:
+            for name in [parameter["Name"], parameter["ARN"]]:
+                if name in names:
+                    values[names[name]] = parameter["Value"]
+
+    else:
+        response = client.batch_get_secret_value(SecretIdList=references)
+        for secret in response["SecretValues"]:
+            arn = secret["ARN"]
+            for reference in references:
+                # a secret's ARN might be given without its random suffix
+                if arn == reference or arn.startswith(f"{reference}-"):
+                    values[reference] = secret.get("SecretString", "")
+
+    for reference in references:
+        if reference not in values:
+            print(f"warning: could not resolve {reference}", file=stderr)
+
+    return values
+
+
+def write_bulk_output(
+    named_vars: Iterable[NamedVars],
+    output_dir: Optional[str],
+):
+    """
+    Streams out each function's variables, either as a NAME.env file in
+    the output directory or as another member of one JSON object.
+    """
+
+    from json import dumps
+    from os import makedirs
+    from os.path import join
+
+    if output_dir:
+        makedirs(output_dir, exist_ok=True)
+    else:
+        print("{", end="")
+
+    for count, (function_name, vars) in enumerate(named_vars):
+        if output_dir:
+            path = join(output_dir, f"{function_name}.env")
+            with open(path, "w") as output:
+                print(*get_dotenv_lines(vars), sep="\n", file=output)
+            print(path, file=stderr)
+        else:
+            separator = "," if count else ""
+            print(f"{separator}\n  {dumps(function_name)}: ", end="")
+            print(dumps(vars), end="", flush=True)
+
+    if not output_dir:
+        print("\n}")
+
+
+def get_dotenv_lines(vars: Dict[str, str]):
+    from shlex import quote
+
+    return ("=".join(map(quote, pair)) for pair in vars.items())
+
+
+def get_lambda_vars(session: Session, config: dict):
+    function_name = config["FunctionName"]
 
     # This is a partial list; for all built-in environment variables, see:
     # <https://docs.aws.amazon.com/lambda/latest/dg/configuration-envvars.html>
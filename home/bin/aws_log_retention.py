@@ -10,32 +10,109 @@ across multiple regions.
 
 from argparse import ArgumentParser
 from os import getenv
-from typing import Iterator, List, Optional, Tuple
+from sys import stderr
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    cast,
+)
 
 from boto3 import Session
 
 Retention = Optional[int]
-GroupRetention = Tuple[str, Retention]
+
+# With --refresh, cached region lists and log group inventories older than
+# this many seconds are listed again from AWS; everything else is reused.
+DEFAULT_CACHE_TTL = 24 * 60 * 60
+
+# Inventories cached for credentials from the environment are removed once
+# unused for this long, as temporary access keys (e.g. from aws-as-role) are
+# replaced every session and their inventories can never be found again.
+ENV_CACHE_KEEP_SECONDS = 24 * 60 * 60
+
+
+class LogGroup(NamedTuple):
+    name: str
+    retention: Retention
+    stored_bytes: int
+    creation_time: Optional[int] = None  # milliseconds since epoch
 
 
 def main():
-    args = get_parser().parse_args()
+    from os import environ
+
+    parser = get_parser()
+    args = parser.parse_args()
+    if args.retention_in_days and not args.report:
+        if args.cached or args.refresh:
+            parser.error("--cached and --refresh cannot change policies")
+
     session = Session(profile_name=args.profile)
-    regions = get_regions(session) if args.region == "all" else [args.region]
+    cache = get_inventory_cache(
+        parser.prog,
+        session.profile_name,
+        None if args.profile else environ.get("AWS_ACCESS_KEY_ID"),
+    )
+    max_age = (
+        float("inf") if args.cached else args.cache_ttl if args.refresh else 0
+    )
+    regions = (
+        get_regions(session, cache, max_age)
+        if args.region == "all"
+        else [args.region]
+    )
     wanted = (
         -1 if args.retention_in_days == "forever" else args.retention_in_days
     )
 
+    if args.report:
+        write_report(
+            rows=get_report_rows(
+                inventories=(
+                    (
+                        region,
+                        get_inventory(
+                            session=session,
+                            cache=cache,
+                            region=region,
+                            prefix=args.log_group_name_prefix,
+                            max_age=max_age,
+                        ),
+                    )
+                    for region in regions
+                ),
+                wanted=wanted,
+            ),
+            output_format=args.report,
+        )
+        return
+
     for region in regions:
         print()
         print(f"checking {region}...")
         run_check(
             session=session,
             region=region,
-            prefix=args.log_group_name_prefix,
+            groups=get_inventory(
+                session=session,
+                cache=cache,
+                region=region,
+                prefix=args.log_group_name_prefix,
+                max_age=max_age,
+            ),
             wanted=wanted,
             dry_run=args.dry_run,
         )
+        if wanted is not None and not args.dry_run:
+            try:  # policies were changed, so any cached inventory is stale
+                del cache[region]
+            except KeyError:
+                pass
         print(f"done with {region}")
 
 
@@ -71,7 +148,8 @@ def get_parser():
         help="""
             set retention policy for matching log groups to specified number of
             days, or use "forever" to unset the retention policy, or omit to
-            just view the current policy
+            just view the current policy; with --report, this is only used to
+            estimate savings
         """,
         choices=[
             "forever",
@@ -102,26 +180,179 @@ def get_parser():
         help="show policy retention changes without actually configuring them",
         action="store_true",
     )
+    parser.add_argument(
+        "--report",
+        help="""
+            instead of viewing or setting policies, stream a row for every log
+            group (stored bytes, creation time, and retention) followed by
+            summary rows per region, per name prefix, and per retention; with
+            --retention-in-days, also estimate the bytes that retention would
+            save, assuming each group's data was written at a steady rate;
+            "json" gives one JSON object per line
+        """,
+        choices=["csv", "json"],
+        type=lambda value: value.strip().lower(),
+    )
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument(
+        "--cached",
+        help="""
+            view current policies using the on-disk region list and log group
+            inventory from an earlier run regardless of their age, only asking
+            AWS about regions that have never been listed; with credentials
+            from the environment, e.g. under aws-as-role, only inventories
+            listed with the same access key are used
+        """,
+        action="store_true",
+    )
+    cache_group.add_argument(
+        "--refresh",
+        help="""
+            view current policies like --cached, but list regions whose cached
+            inventory is older than --cache-ttl again
+        """,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        help="""
+            seconds that a cached region list or log group inventory stays
+            fresh for --refresh; default is %(default)s
+        """,
+        default=DEFAULT_CACHE_TTL,
+        metavar="SECONDS",
+        type=int,
+    )
 
     return parser
 
 
-def get_regions(session: Session) -> List[str]:
+def get_inventory_cache(
+    prog: str,
+    profile: str,
+    access_key_id: Optional[str],
+):
+    """
+    Returns a dict-like object for caching region lists and log group
+    inventories on-disk, e.g. in ~/.cache/aws-log-retention/default/.
+    Every run that lists all of a region's log groups records them here
+    so that later --cached or --refresh runs can skip doing so.
+
+    Entries are kept per profile rather than per account because finding
+    the account would take an STS round trip, which is what the cache is
+    trying to avoid in the first place. Credentials from the environment,
+    as under aws-as-role, still report the "default" profile, so they are
+    kept per hashed access key ID instead, e.g. in default-env-0123abcd/,
+    and any such directories left unused by earlier keys are pruned.
+    """
+
+    from glob import glob
+    from hashlib import sha1
+    from os import makedirs, utime
+    from os.path import getmtime, join
+    from shutil import rmtree
+    from time import time
+
+    from appdirs import user_cache_dir
+    from botocore.utils import JSONFileCache
+
+    prog_cache_dir = user_cache_dir(appname=prog)
+    if not access_key_id:
+        our_cache_dir = join(prog_cache_dir, profile)
+    else:
+        key_hash = sha1(access_key_id.encode("utf-8")).hexdigest()[:12]
+        our_cache_dir = join(prog_cache_dir, f"{profile}-env-{key_hash}")
+        makedirs(our_cache_dir, exist_ok=True)
+        utime(our_cache_dir)  # so pruning goes by when last used
+        for env_cache_dir in glob(join(prog_cache_dir, "*-env-*")):
+            try:
+                unused_seconds = time() - getmtime(env_cache_dir)
+            except FileNotFoundError:  # pruned by a concurrent run
+                continue
+            if env_cache_dir != our_cache_dir and (
+                unused_seconds > ENV_CACHE_KEEP_SECONDS
+            ):
+                rmtree(env_cache_dir, ignore_errors=True)
+
+    return cast(Dict[str, dict], JSONFileCache(working_dir=our_cache_dir))
+
+
+def get_cached(cache: Dict[str, dict], key: str, max_age: float):
+    from time import time
+
+    try:
+        entry = cache[key]
+        assert time() - entry["Timestamp"] <= max_age
+    except (KeyError, AssertionError):
+        return None
+    else:
+        return entry
+
+
+def get_regions(
+    session: Session,
+    cache: Dict[str, dict],
+    max_age: float,
+) -> List[str]:
+    from time import time
+
+    if entry := get_cached(cache, "regions", max_age):
+        return entry["Regions"]
+
     ec2 = session.client("ec2", region_name="us-east-1")
     response = ec2.describe_regions()
-    return sorted([region["RegionName"] for region in response["Regions"]])
+    regions = sorted([region["RegionName"] for region in response["Regions"]])
+    cache["regions"] = dict(Timestamp=time(), Regions=regions)
+    return regions
+
+
+def get_inventory(
+    session: Session,
+    cache: Dict[str, dict],
+    region: str,
+    prefix: Optional[str],
+    max_age: float,
+) -> Iterator[LogGroup]:
+    from time import localtime, strftime, time
+
+    if entry := get_cached(cache, region, max_age):
+        as_of = strftime("%Y-%m-%d %H:%M", localtime(entry["Timestamp"]))
+        print(f"using log groups cached as of {as_of}", file=stderr)
+        cached = (LogGroup(**group) for group in entry["LogGroups"])
+        yield from (
+            group
+            for group in cached
+            if not prefix or group.name.startswith(prefix)
+        )
+        return
+
+    logs = session.client("logs", region_name=region)
+    if prefix:  # a partial listing isn't worth caching
+        yield from get_groups(logs, prefix)
+        return
+
+    timestamp = time()
+    groups: List[LogGroup] = []
+    for group in get_groups(logs, prefix):
+        groups.append(group)
+        yield group
+    cache[region] = dict(
+        Timestamp=timestamp,
+        LogGroups=[group._asdict() for group in groups],
+    )
 
 
 def run_check(
     session: Session,
     region: str,
-    prefix: str,
+    groups: Iterable[LogGroup],
     wanted: Retention,
     dry_run: bool,
 ):
-    logs = session.client("logs", region_name=region)
+    logs = None
 
-    for name, current in get_groups(logs, prefix):
+    for group in groups:
+        name, current = group.name, group.retention
         print(f"  {name}: ", end="")
 
         if wanted is None:
@@ -133,6 +364,7 @@ def run_check(
                 print(f"would unset from {get_desc(current)}")
             else:
                 print(f"unsetting from {get_desc(current)}")
+                logs = logs or session.client("logs", region_name=region)
                 logs.delete_retention_policy(logGroupName=name)
         elif wanted == current:
             print(f"already {get_desc(current)}")
@@ -140,20 +372,26 @@ def run_check(
             print(f"would change {get_desc(current)} to {get_desc(wanted)}")
         else:
             print(f"changing {get_desc(current)} to {get_desc(wanted)}")
+            logs = logs or session.client("logs", region_name=region)
             logs.put_retention_policy(
                 logGroupName=name,
                 retentionInDays=wanted,
             )
 
 
-def get_groups(logs, prefix: str) -> Iterator[GroupRetention]:
-    def page(next_token=None) -> Tuple[List[GroupRetention], Optional[str]]:
+def get_groups(logs, prefix: Optional[str]) -> Iterator[LogGroup]:
+    def page(next_token=None) -> Tuple[List[LogGroup], Optional[str]]:
         response = logs.describe_log_groups(
             **dict(logGroupNamePrefix=prefix) if prefix else {},
             **dict(nextToken=next_token) if next_token else {},
         )
         groups = [
-            (group["logGroupName"], group.get("retentionInDays"))
+            LogGroup(
+                name=group["logGroupName"],
+                retention=group.get("retentionInDays"),
+                stored_bytes=group.get("storedBytes", 0),
+                creation_time=group.get("creationTime"),
+            )
             for group in response["logGroups"]
         ]
         return groups, response.get("nextToken")
@@ -165,6 +403,131 @@ def get_groups(logs, prefix: str) -> Iterator[GroupRetention]:
         yield from groups
 
 
+def get_report_rows(
+    inventories: Iterable[Tuple[str, Iterable[LogGroup]]],
+    wanted: Retention,
+) -> Iterator[dict]:
+    from collections import defaultdict
+    from datetime import datetime, timezone
+    from time import time
+
+    now = time()
+    summaries: Dict[Tuple[str, str, str], List[int]] = defaultdict(
+        lambda: [0, 0, 0]  # group count, stored bytes, estimated bytes saved
+    )
+
+    for region, groups in inventories:
+        print(f"checking {region}...", file=stderr)
+        for group in groups:
+            saved = get_estimated_savings(group, wanted, now)
+            created = (
+                datetime.fromtimestamp(
+                    group.creation_time / 1000, timezone.utc
+                )
+                if group.creation_time
+                else None
+            )
+            yield get_report_row(
+                kind="group",
+                region=region,
+                name=group.name,
+                retention=group.retention,
+                created=created.isoformat() if created else None,
+                totals=[1, group.stored_bytes, saved],
+            )
+
+            for key in [
+                ("region", region, ""),
+                ("prefix", "", get_name_prefix(group.name)),
+                ("retention", "", get_desc(group.retention)),
+                ("total", "", ""),
+            ]:
+                totals = summaries[key]
+                totals[0] += 1
+                totals[1] += group.stored_bytes
+                totals[2] += saved
+
+    for (kind, region, name), totals in sorted(summaries.items()):
+        yield get_report_row(
+            kind=kind, region=region, name=name, totals=totals
+        )
+
+
+def get_report_row(
+    kind: str,
+    region: str,
+    name: str,
+    totals: List[int],
+    retention: Retention = None,
+    created: Optional[str] = None,
+) -> dict:
+    group_count, stored_bytes, saved_bytes = totals
+    return {
+        "kind": kind,
+        "region": region,
+        "name": name,
+        "retention_in_days": retention,
+        "creation_time": created,
+        "group_count": group_count,
+        "stored_bytes": stored_bytes,
+        "estimated_bytes_saved": saved_bytes,
+    }
+
+
+def write_report(rows: Iterable[dict], output_format: str):
+    from csv import DictWriter
+    from json import dumps
+    from sys import stdout
+
+    writer = None
+    for row in rows:
+        if output_format == "json":
+            print(dumps(row), flush=True)
+        else:
+            if not writer:
+                writer = DictWriter(stdout, fieldnames=list(row.keys()))
+                writer.writeheader()
+            writer.writerow(row)
+            stdout.flush()
+
+
+def get_estimated_savings(group: LogGroup, wanted: Retention, now: float):
+    """
+    Returns roughly how many of a group's stored bytes would go away if
+    its retention were lowered to the wanted number of days. CloudWatch
+    Logs does not say how stored bytes are spread over time, so this
+    assumes that they were written evenly over whatever span is being
+    kept now (the lesser of the group's age and its current retention).
+    """
+
+    if not wanted or wanted == -1 or not group.stored_bytes:
+        return 0
+
+    spans: List[Optional[float]] = [group.retention]  # in days
+    if group.creation_time:
+        spans.append((now - group.creation_time / 1000) / 86400)
+    kept = min(filter(None, spans), default=None)
+    if not kept or wanted >= kept:
+        return 0
+
+    return round(group.stored_bytes * (1 - wanted / kept))
+
+
+def get_name_prefix(name: str) -> str:
+    """
+    Returns a log group's name up through its first couple of slashes,
+    e.g. "/aws/lambda/" for "/aws/lambda/my-function", for summarizing
+    by the service (or the team) that most likely created it.
+    """
+
+    parts = name.split("/")
+    depth = 3 if name.startswith("/") else 1
+    if len(parts) <= depth:
+        return name
+
+    return "/".join(parts[:depth]) + "/"
+
+
 def get_desc(retention: Retention) -> str:
     return (
         "never expires"
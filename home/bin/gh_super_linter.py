@@ -10,22 +10,132 @@ for more information.
 from collections import namedtuple
 from os import getcwd
 from pathlib import Path
-from typing import Any, Callable, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
 DOCKER_IMAGE = "ghcr.io/super-linter/super-linter"
 GITHUB_ACTION = "super-linter/super-linter"
 DEFAULT_VERSION = "latest"
 CODEBASE_MOUNT = "/tmp/lint"
+ENTRYPOINT = "/action/lib/linter.sh"
+
+# Containers kept warm by --warm are stopped after going this long without
+# being used; each lint run touches the heartbeat file in the container.
+DEFAULT_IDLE_TIMEOUT = 15 * 60
+HEARTBEAT_PATH = "/tmp/gh-super-linter-heartbeat"
+
+# How Super-Linter's log marks each linter starting and finishing, and each
+# file being linted; finish markers are missing from older versions.
+LINTER_START_MARKER = r"Linting \[?([A-Z][A-Z0-9_]*)\]? (?:files|items)"
+LINTER_FINISH_MARKER = (
+    r"(?:Successfully linted|Found errors (?:when linting|in)) "
+    r"\[?([A-Z][A-Z0-9_]*)\]?"
+)
+FILE_MARKER = r"File:\[([^\]]+)\]"
+
+# Lint results are cached against these, besides the file's own content:
+# everything in the rules path (which LINTER_RULES_PATH can override), plus
+# dotfiles and these files wherever they are in the codebase, as linters
+# also pick up configuration from the directories of the files they lint.
+DEFAULT_LINTER_RULES_PATH = ".github/linters"
+CONFIG_NAMES = {
+    *("Cargo.toml", "composer.json", "go.mod", "go.sum", "package.json"),
+    *("pyproject.toml", "setup.cfg", "tox.ini", "tsconfig.json"),
+    *("biome.json", "mypy.ini", "pylintrc", "ruff.toml"),
+    *("eslint.config.js", "eslint.config.cjs", "eslint.config.mjs"),
+}
+
+# These linters check files against each other (e.g. imports, types or
+# duplicates), so a file that passed them may fail once another changes;
+# the result cache warns when any are enabled, as it cannot tell.
+CROSS_FILE_LINTERS = {
+    *("CSHARP", "DOTNET_SLN_FORMAT_ANALYZERS", "GO", "GO_MODULES"),
+    *("JAVASCRIPT_ES", "JSCPD", "JSX", "JUPYTER_NBQA_MYPY", "PHP_PHPSTAN"),
+    *("PHP_PSALM", "PYTHON_MYPY", "PYTHON_PYLINT", "RUST_2015", "RUST_2018"),
+    *("RUST_2021", "RUST_CLIPPY", "TERRAFORM_TFLINT", "TSX", "TYPESCRIPT_ES"),
+}
+
+# Beyond this, the paths to lint are left unfiltered rather than risk an
+# environment variable longer than Linux allows.
+MAX_PATHS_FILTER_LENGTH = 100_000
+
+# Each linter Super-Linter can be told to run by setting VALIDATE_<LINTER>.
+# With --shards, the image's own list (see IMAGE_LINTERS_SCRIPT) is spread
+# across containers instead, as images add and rename linters over time.
+LINTERS = (
+    "ANSIBLE ARM BASH BASH_EXEC BIOME_FORMAT BIOME_LINT CHECKOV CLANG_FORMAT "
+    "CLOJURE CLOUDFORMATION COFFEESCRIPT CPP CSHARP CSS CSS_PRETTIER DART "
+    "DOCKERFILE_HADOLINT DOTNET_SLN_FORMAT_ANALYZERS DOTNET_SLN_FORMAT_STYLE "
+    "DOTNET_SLN_FORMAT_WHITESPACE EDITORCONFIG ENV GIT_COMMITLINT "
+    "GIT_MERGE_CONFLICT_MARKERS GITHUB_ACTIONS GITHUB_ACTIONS_ZIZMOR GITLEAKS "
+    "GO GO_MODULES GO_RELEASER GOOGLE_JAVA_FORMAT GRAPHQL_PRETTIER GROOVY "
+    "HTML HTML_PRETTIER JAVA JAVASCRIPT_ES JAVASCRIPT_PRETTIER JSCPD JSON "
+    "JSON_PRETTIER JSONC JSONC_PRETTIER JSX JSX_PRETTIER JUPYTER_NBQA_BLACK "
+    "JUPYTER_NBQA_FLAKE8 JUPYTER_NBQA_ISORT JUPYTER_NBQA_MYPY "
+    "JUPYTER_NBQA_PYLINT JUPYTER_NBQA_RUFF KOTLIN KUBERNETES_KUBECONFORM "
+    "LATEX LUA MARKDOWN MARKDOWN_PRETTIER NATURAL_LANGUAGE OPENAPI PERL PHP "
+    "PHP_BUILTIN PHP_PHPCS PHP_PHPSTAN PHP_PSALM POWERSHELL PRE_COMMIT "
+    "PROTOBUF PYTHON_BLACK PYTHON_FLAKE8 PYTHON_ISORT PYTHON_MYPY "
+    "PYTHON_PYINK PYTHON_PYLINT PYTHON_RUFF PYTHON_RUFF_FORMAT R RAKU "
+    "RENOVATE RUBY RUST_2015 RUST_2018 RUST_2021 RUST_CLIPPY SCALAFMT "
+    "SHELL_SHFMT SNAKEMAKE_LINT SNAKEMAKE_SNAKEFMT SPELL_CODESPELL SQLFLUFF "
+    "STATES TERRAFORM_FMT TERRAFORM_TERRASCAN TERRAFORM_TFLINT TERRAGRUNT "
+    "TRIVY TSX TYPESCRIPT_ES TYPESCRIPT_PRETTIER TYPESCRIPT_STANDARD VUE "
+    "VUE_PRETTIER XML YAML YAML_PRETTIER"
+).split()
+
+# Prints the linters a Super-Linter image can run, as kept by the image.
+IMAGE_LINTERS_SCRIPT = (
+    "source /action/lib/globals/languages.sh && echo ${LANGUAGE_ARRAY[@]}"
+)
 
 Setup = namedtuple("Setup", ["path", "job", "step", "img", "env"])
 
 
 def main():
+    from subprocess import CalledProcessError
+
     parser = get_parser()
     args = parser.parse_args()
-    setups = get_superlinter_setups(args.workflow_file, parser.error)
+    if args.warm and args.shards > 1:
+        parser.error("--warm cannot be combined with --shards")
+
+    setups = get_superlinter_setups(
+        args.workflow_file,
+        parser.error,
+        get_cache_path(parser.prog),
+    )
     setup = choose_superlinter_setup(setups)
-    run_docker_container(setup, args.codebase_path, args.dry_run)
+
+    changed_paths = None
+    if args.changed_since:
+        try:
+            changed_paths = get_changed_paths(
+                args.codebase_path,
+                args.changed_since,
+            )
+        except CalledProcessError as error:
+            parser.error(
+                f"cannot diff {args.codebase_path} against "
+                f"{args.changed_since}: {error.stderr.strip()}"
+            )
+        if not changed_paths:
+            print(f"Nothing has changed since {args.changed_since}.")
+            return
+
+    return run_docker_container(
+        setup,
+        args.codebase_path,
+        args.dry_run,
+        changed_paths,
+        args.shards,
+        args.idle_timeout if args.warm else None,
+        (
+            get_cache_path(parser.prog, "-results")
+            if args.result_cache
+            else None
+        ),
+        args.timings_json,
+    )
 
 
 def get_parser():
@@ -42,6 +152,15 @@ def get_parser():
             parser.error(f"{value} is not a directory")
         return value
 
+    def positive_int(value: str) -> int:
+        try:
+            number = int(value)
+        except ValueError:
+            number = 0
+        if number < 1:
+            parser.error(f"{value} is not a positive whole number")
+        return number
+
     parser.add_argument(
         "codebase_path",
         help=f"""
@@ -61,6 +180,65 @@ def get_parser():
             auto-detect your workflow
         """,
     )
+    parser.add_argument(
+        "--changed-since",
+        metavar="REF",
+        help="""
+            only lint files added or modified since your branch diverged from
+            the given Git ref (e.g. origin/main), including uncommitted and
+            untracked files, much like Super-Linter does for pull requests
+        """,
+    )
+    parser.add_argument(
+        "--shards",
+        metavar="N",
+        help="""
+            split the enabled linters across this many containers run at the
+            same time, each limited to its share of CPUs and memory; defaults
+            to %(default)s
+        """,
+        default=1,
+        type=positive_int,
+    )
+    parser.add_argument(
+        "--warm",
+        help="""
+            lint using a long-lived container for this Super-Linter version and
+            codebase, starting one if needed, rather than a fresh container
+            every time; cannot be combined with --shards
+        """,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        metavar="SECONDS",
+        help="""
+            when starting a container with --warm, stop it after going this
+            long without a lint run; defaults to %(default)s
+        """,
+        default=DEFAULT_IDLE_TIMEOUT,
+        type=positive_int,
+    )
+    parser.add_argument(
+        "--result-cache",
+        help="""
+            skip files whose content already passed the same linters with the
+            same Super-Linter image, environment and linter configuration
+            files; as each file is only judged by its own content, linters that
+            check files against each other (e.g. mypy, ESLint with type
+            information, or jscpd) can miss problems caused by other files
+            changing, so only use this for quick checks between full runs
+        """,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--timings-json",
+        metavar="PATH",
+        help="""
+            besides printing how long each linter and type of file took, write
+            those timings to this JSON file
+        """,
+    )
     parser.add_argument(
         "--dry-run",
         help="show how Docker would have been invoked without doing so",
@@ -70,18 +248,67 @@ def get_parser():
     return parser
 
 
-def get_superlinter_setups(workflow_path: str, error: Callable[[str], Any]):
-    from yaml import Loader, load
+def get_superlinter_setups(
+    workflow_path: str,
+    error: Callable[[str], Any],
+    cache_path: str,
+):
+    """
+    Returns Super-Linter setups from the given or auto-detected workflow
+    files. Setups found in each file are cached along with its mtime and
+    size, so unchanged files are not read again, and files that do not
+    even mention Super-Linter are not parsed as YAML at all.
+    """
+
+    from json import dump, load
+    from os import makedirs, replace
+    from os.path import dirname
+
+    try:
+        with open(cache_path) as input:
+            cache: Dict[str, dict] = load(input)
+    except (OSError, ValueError):
+        cache = {}
+    is_cache_changed = False
 
     setups: List[Setup] = []
     for path in [workflow_path] if workflow_path else get_workflow_paths():
-        with open(path) as input:
-            for job_id, job_spec in load(input, Loader=Loader)["jobs"].items():
-                for step_num, step_spec in enumerate(job_spec["steps"], 1):
-                    if img := get_docker_container_image_version(step_spec):
-                        env = get_env_without_expressions(step_spec)
-                        setup = Setup(str(path), job_id, step_num, img, env)
-                        setups.append(setup)
+        stat = Path(path).stat()
+        key = str(Path(path).resolve())
+        entry = cache.get(key)
+
+        if (
+            entry
+            and entry["mtime_ns"] == stat.st_mtime_ns
+            and entry["size"] == stat.st_size
+        ):
+            file_setups = entry["setups"]
+        else:
+            with open(path, "rb") as input:
+                raw = input.read()
+            file_setups = (
+                get_workflow_setups(raw)
+                if GITHUB_ACTION.encode("utf-8") in raw
+                else []
+            )
+            cache[key] = dict(
+                mtime_ns=stat.st_mtime_ns,
+                size=stat.st_size,
+                setups=file_setups,
+            )
+            is_cache_changed = True
+
+        for job_id, step_num, img, env in file_setups:
+            setups.append(Setup(str(path), job_id, step_num, img, env))
+
+    if is_cache_changed:
+        makedirs(dirname(cache_path), exist_ok=True)
+        try:
+            with open(f"{cache_path}.tmp", "w") as output:
+                dump(cache, output)
+            replace(f"{cache_path}.tmp", cache_path)
+        except (OSError, TypeError, ValueError):  # e.g. unusual YAML values
+            pass
 
     if workflow_path and not setups:
         error(f"{workflow_path} does not use Super-Linter.")
@@ -89,6 +316,37 @@ def get_superlinter_setups(workflow_path: str, error: Callable[[str], Any]):
     return setups
 
 
+def get_workflow_setups(raw: bytes) -> List[list]:
+    try:  # libyaml is much faster, but PyYAML might be built without it
+        from yaml import CLoader as Loader
+    except ImportError:
+        from yaml import Loader
+    from yaml import load
+
+    return [
+        [job_id, step_num, img, get_env_without_expressions(step_spec)]
+        for job_id, job_spec in load(raw, Loader=Loader)["jobs"].items()
+        for step_num, step_spec in enumerate(job_spec["steps"], 1)
+        if (img := get_docker_container_image_version(step_spec))
+    ]
+
+
+def get_cache_path(prog: str, suffix: str = "") -> str:
+    """
+    Returns where to cache setups (or, given a suffix, something else) for
+    the current directory's repository, e.g.
+    ~/.cache/gh-super-linter/0123456789abcdef.json.
+    """
+
+    from hashlib import sha1
+    from os import environ
+    from os.path import expanduser, join
+
+    cache_home = environ.get("XDG_CACHE_HOME") or expanduser("~/.cache")
+    repository_key = sha1(getcwd().encode("utf-8")).hexdigest()[:16]
+    return join(cache_home, prog, f"{repository_key}{suffix}.json")
+
+
 def get_workflow_paths():
     current = Path(getcwd())
 
@@ -175,14 +433,17 @@ def run_docker_container(
     setup: Optional[Setup],
     codebase_path: str,
     dry_run: bool,
+    changed_paths: Optional[List[str]] = None,
+    shards: int = 1,
+    idle_timeout: Optional[int] = None,
+    result_cache_path: Optional[str] = None,
+    timings_path: Optional[str] = None,
 ):
     from shlex import quote
-    from subprocess import run
 
-    args = ["docker", "run", "--rm", "--env", "RUN_LOCAL=true"]
+    env: Dict[str, Any] = dict(RUN_LOCAL=True)
 
     print(f"Mounting {codebase_path} as {CODEBASE_MOUNT} in container.")
-    args.extend(["--volume", f"{codebase_path}:{CODEBASE_MOUNT}"])
 
     no_git = not Path(codebase_path).joinpath(".git").is_dir()
     no_ufa_env = not (setup and "USE_FIND_ALGORITHM" in setup.env)
@@ -191,19 +452,94 @@ def run_docker_container(
             f"{codebase_path} won't have a .git directory once mounted; "
             "enabling USE_FIND_ALGORITHM so linter will be able to run."
         )
-        args.extend(["--env", "USE_FIND_ALGORITHM=true"])
+        env["USE_FIND_ALGORITHM"] = True
 
     if setup:
         print(
             f"Taking environment and container version from step {setup.step} "
             f'in the "{setup.job}" job as specified by {setup.path}.'
         )
-        for key, value in setup.env.items():
-            args.extend(["--env", f"{key}={get_env_value_as_str(value)}"])
-        args.append(f"{DOCKER_IMAGE}:{setup.img}")
+        env.update(setup.env)
+        image = f"{DOCKER_IMAGE}:{setup.img}"
     else:
         print(f"Using {DEFAULT_VERSION} Super-Linter without any environment.")
-        args.append(f"{DOCKER_IMAGE}:{DEFAULT_VERSION}")
+        image = f"{DOCKER_IMAGE}:{DEFAULT_VERSION}"
+
+    lint_paths = changed_paths  # or None to lint everything
+    is_filtered = changed_paths is not None
+    if changed_paths is not None:
+        print(f"Only linting the {len(changed_paths)} changed path(s).")
+
+    result_cache = None
+    if result_cache_path:
+        codebase_paths = get_codebase_paths(codebase_path)
+        result_cache = ResultCache(
+            result_cache_path,
+            get_result_context_key(image, codebase_path, env, codebase_paths),
+            codebase_path,
+        )
+        enabled_linters = get_enabled_linters(env)
+        if cross_file_linters := CROSS_FILE_LINTERS & {*enabled_linters}:
+            print(
+                "Skipping files that already passed may miss problems that "
+                "other files' changes cause for "
+                f"{', '.join(sorted(cross_file_linters))}."
+            )
+        lint_paths = result_cache.get_unpassed(
+            get_included_paths(
+                codebase_paths if lint_paths is None else lint_paths,
+                env.get("FILTER_REGEX_INCLUDE"),
+            ),
+            enabled_linters,
+        )
+        if result_cache.hit_count:
+            print(
+                f"Skipping {result_cache.hit_count} unchanged file(s) that "
+                "already passed."
+            )
+            is_filtered = True
+        if not lint_paths:
+            print("Everything has already passed; nothing to lint.")
+            return 0
+
+    if is_filtered and lint_paths is not None:
+        paths_filter = get_paths_filter(
+            lint_paths,
+            env.get("FILTER_REGEX_INCLUDE"),
+        )
+        if len(paths_filter) > MAX_PATHS_FILTER_LENGTH:
+            print("Too many paths to list for Super-Linter; linting them all.")
+        else:
+            env["FILTER_REGEX_INCLUDE"] = paths_filter
+
+    def record_passed(passed_env: Dict[str, Any]):
+        if result_cache and lint_paths is not None and not dry_run:
+            result_cache.add_passed(
+                lint_paths, get_enabled_linters(passed_env)
+            )
+            result_cache.save()
+
+    if shards > 1:
+        return run_sharded_containers(
+            image,
+            codebase_path,
+            env,
+            shards,
+            dry_run,
+            record_passed,
+            timings_path,
+        )
+
+    if idle_timeout:
+        args = get_warm_container_args(
+            image,
+            codebase_path,
+            env,
+            idle_timeout,
+            dry_run,
+        )
+    else:
+        args = get_docker_run_args(image, codebase_path, env)
 
     print()
     print("Would invoke Docker with:" if dry_run else "Starting Docker...")
@@ -211,7 +547,716 @@ def run_docker_container(
 
     if not dry_run:
         print()
-        run(args)
+        timer = LintTimer()
+        returncode = run_container(args, timer)
+        if returncode == 0:
+            record_passed(env)
+        report_timings([timer], timings_path)
+        return returncode
+
+
+def get_docker_run_args(
+    image: str,
+    codebase_path: str,
+    env: Dict[str, Any],
+    options: Sequence[str] = (),
+) -> List[str]:
+    return [
+        "docker",
+        "run",
+        "--rm",
+        *options,
+        "--volume",
+        f"{codebase_path}:{CODEBASE_MOUNT}",
+        *get_docker_env_args(env),
+        image,
+    ]
+
+
+def get_docker_env_args(env: Dict[str, Any]) -> List[str]:
+    return [
+        arg
+        for key, value in env.items()
+        for arg in ["--env", f"{key}={get_env_value_as_str(value)}"]
+    ]
+
+
+def get_warm_container_args(
+    image: str,
+    codebase_path: str,
+    env: Dict[str, Any],
+    idle_timeout: int,
+    dry_run: bool,
+) -> List[str]:
+    """
+    Returns how to lint inside the long-lived container for the given
+    image and codebase, starting it first if it is not already running.
+    The container idles until nothing has linted in it for idle_timeout
+    seconds, then exits and is removed. As the environment is passed on
+    each lint run, setups that only differ in environment share it.
+    """
+
+    from hashlib import sha1
+    from shlex import quote
+    from subprocess import DEVNULL, run
+
+    container_key = sha1(f"{image}\0{codebase_path}".encode("utf-8"))
+    name = f"gh-super-linter-{container_key.hexdigest()[:12]}"
+
+    try:
+        running = run(
+            [
+                "docker",
+                "container",
+                "inspect",
+                "--format={{.State.Running}}",
+                name,
+            ],
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except FileNotFoundError:  # no docker here, e.g. only dry-running
+        running = ""
+    if running == "true":
+        print(f"Reusing warm container {name}.")
+    else:
+        idle_script = (
+            f"touch {HEARTBEAT_PATH}; "
+            f"while pgrep -f '[l]inter.sh' >/dev/null || "
+            f"[ $(($(date +%s) - $(stat -c %Y {HEARTBEAT_PATH}))) "
+            f"-lt {idle_timeout} ]; do sleep 10; done"
+        )
+        start_args = [
+            *get_docker_run_args(
+                image,
+                codebase_path,
+                {},
+                ["--detach", f"--name={name}", "--entrypoint=/bin/sh"],
+            ),
+            "-c",
+            idle_script,
+        ]
+
+        print()
+        print(
+            "Would start warm container with:"
+            if dry_run
+            else f"Starting warm container {name}, idling {idle_timeout}s..."
+        )
+        print(*map(quote, start_args))
+        if not dry_run:
+            run(start_args, stdout=DEVNULL)
+
+    return [
+        "docker",
+        "exec",
+        *get_docker_env_args(env),
+        name,
+        "/bin/sh",
+        "-c",
+        f"touch {HEARTBEAT_PATH}; {ENTRYPOINT}; status=$?; "
+        f"touch {HEARTBEAT_PATH}; exit $status",
+    ]
+
+
+def run_sharded_containers(
+    image: str,
+    codebase_path: str,
+    env: Dict[str, Any],
+    shards: int,
+    dry_run: bool,
+    record_passed: Callable[[Dict[str, Any]], Any],
+    timings_path: Optional[str],
+):
+    """
+    Splits the enabled linters across several containers run at once,
+    each limited to its share of this machine's CPUs and memory, then
+    reports how each of them fared. Returns 1 if any shard failed.
+    """
+
+    from concurrent.futures import ThreadPoolExecutor
+    from shlex import quote
+
+    linters = get_image_linters(image, dry_run)
+    shard_envs = get_shard_envs(env, shards, linters)
+    options = get_shard_resource_options(len(shard_envs))
+    shard_args = [
+        get_docker_run_args(image, codebase_path, shard_env, options)
+        for shard_env in shard_envs
+    ]
+
+    print()
+    print(
+        f"Would invoke Docker {len(shard_args)} times with:"
+        if dry_run
+        else f"Starting Docker {len(shard_args)} times..."
+    )
+    for args in shard_args:
+        print(*map(quote, args))
+
+    if dry_run:
+        return
+
+    print()
+    with ThreadPoolExecutor(max_workers=len(shard_args)) as executor:
+        results = list(
+            executor.map(run_shard, range(1, len(shard_args) + 1), shard_args)
+        )
+
+    print()
+    print(f"{'Shard':<7}{'Result':<8}{'Seconds':>9}  Linters")
+    for number, (shard_env, (returncode, seconds, _)) in enumerate(
+        zip(shard_envs, results), 1
+    ):
+        shard_linters = get_enabled_linters(shard_env, linters)
+        if returncode == 0:
+            record_passed(shard_env)
+        print(
+            f"{number:<7}{'passed' if returncode == 0 else 'FAILED':<8}"
+            f"{seconds:>9.1f}  {', '.join(shard_linters)}"
+        )
+
+    failed = sum(1 for returncode, _, _ in results if returncode != 0)
+    print()
+    print(
+        f"{failed} of {len(results)} shard(s) failed."
+        if failed
+        else f"All {len(results)} shards passed."
+    )
+    report_timings([timer for _, _, timer in results], timings_path)
+    return 1 if failed else 0
+
+
+def get_image_linters(image: str, dry_run: bool) -> List[str]:
+    """
+    Returns the linters the image can run, so that shards between them
+    cover everything an unsharded run would. Falls back to LINTERS, with a
+    warning, if the image cannot be asked, e.g. when dry-running (which
+    should not pull anything) or for images too old to keep such a list.
+    """
+
+    from subprocess import run
+    from sys import stderr
+
+    linters = []
+    if not dry_run:
+        try:
+            linters = run(
+                ["docker", "run", "--rm", "--entrypoint=/bin/bash", image]
+                + ["-c", IMAGE_LINTERS_SCRIPT],
+                capture_output=True,
+                text=True,
+            ).stdout.split()
+        except FileNotFoundError:  # no docker here
+            pass
+
+    if not linters:
+        print(
+            f"warning: could not list the linters {image} can run, so "
+            "shards only cover those this script knows of",
+            file=stderr,
+        )
+    return linters or list(LINTERS)
+
+
+def get_shard_envs(
+    env: Dict[str, Any],
+    shards: int,
+    linters: List[str],
+) -> List[Dict[str, Any]]:
+    """
+    Returns the environment for each shard, where each enables its own
+    share of the given linters that the given environment would have
+    enabled. Super-Linter refuses a mix of VALIDATE_*=true and
+    VALIDATE_*=false, so each shard only lists the linters it should run.
+    """
+
+    enabled = get_enabled_linters(env, linters)
+    common_env = {
+        key: value
+        for key, value in env.items()
+        if key.split("VALIDATE_", 1)[-1] not in {*LINTERS, *linters}
+    }
+
+    return [
+        {
+            **common_env,
+            **{
+                f"VALIDATE_{linter}": True for linter in enabled[index::shards]
+            },
+        }
+        for index in range(min(shards, len(enabled)))
+    ]
+
+
+def get_enabled_linters(
+    env: Dict[str, Any],
+    linters: Sequence[str] = LINTERS,
+) -> List[str]:
+    """
+    Returns the linters Super-Linter would run given the environment: any
+    set to true if there are some, otherwise all but those set to false.
+    """
+
+    settings = {
+        linter: get_env_value_as_str(env[f"VALIDATE_{linter}"]).lower()
+        for linter in linters
+        if f"VALIDATE_{linter}" in env
+    }
+    enabled = [linter for linter, value in settings.items() if value == "true"]
+
+    return enabled or [
+        linter for linter in linters if settings.get(linter) != "false"
+    ]
+
+
+def get_shard_resource_options(shards: int) -> List[str]:
+    from os import cpu_count, sysconf
+
+    options = [f"--cpus={max(1, (cpu_count() or 1) / shards):.2f}"]
+    try:
+        memory = sysconf("SC_PAGE_SIZE") * sysconf("SC_PHYS_PAGES")
+    except (OSError, ValueError):  # e.g. not available on this platform
+        pass
+    else:
+        options.append(f"--memory={memory // shards // 2**20}m")
+
+    return options
+
+
+def run_shard(number: int, args: List[str]):
+    """
+    Runs one shard's container, prefixing each line of its output with the
+    shard number, and returns its exit status, how long it took and how
+    long each of its linters took.
+    """
+
+    from time import monotonic
+
+    started = monotonic()
+    timer = LintTimer()
+    returncode = run_container(args, timer, prefix=f"shard {number} | ")
+
+    return returncode, monotonic() - started, timer
+
+
+def run_container(args: List[str], timer: "LintTimer", prefix: str = ""):
+    """
+    Runs a container, passing along its output as it comes while timing
+    its linters, and returns its exit status.
+    """
+
+    from subprocess import PIPE, STDOUT, Popen
+
+    with Popen(args, stdout=PIPE, stderr=STDOUT, text=True) as process:
+        assert process.stdout
+        for line in process.stdout:
+            print(f"{prefix}{line}", end="", flush=True)
+            timer.feed(line)
+    timer.finish()
+
+    return process.returncode
+
+
+class LintTimer:
+    """
+    Works out how long each linter, and each type of file, took from when
+    Super-Linter's log says it started and finished linting them. Older
+    versions lint "[LINTER] files" one after another without saying when
+    each finishes, so those are taken to have finished once another starts;
+    newer ones lint "LINTER items" in parallel and say when each finishes.
+    """
+
+    def __init__(self):
+        from time import monotonic
+
+        self.started = monotonic()
+        self.finished = self.started
+        self.linter_seconds: Dict[str, float] = {}
+        self.file_type_seconds: Dict[str, float] = {}
+        self.file_type_counts: Dict[str, int] = {}
+        self.linter_starts: Dict[str, float] = {}
+        self.file_start: Optional[Tuple[str, float]] = None
+
+    def feed(self, line: str):
+        from re import search
+        from time import monotonic
+
+        now = monotonic()
+        if match := search(LINTER_START_MARKER, line):
+            linter = match.group(1)
+            if linter in LINTERS and linter not in self.linter_starts:
+                if match.group(0).endswith("files"):  # one linter at a time
+                    self.finish_linters(now)
+                self.linter_starts[linter] = now
+        elif match := search(LINTER_FINISH_MARKER, line):
+            linter = match.group(1)
+            if linter in self.linter_starts:
+                self.finish_linters(now, [linter])
+        elif (match := search(FILE_MARKER, line)) and len(
+            self.linter_starts
+        ) == 1:
+            path = match.group(1).removeprefix(f"{CODEBASE_MOUNT}/")
+            if not self.file_start or self.file_start[0] != path:
+                self.finish_file(now)
+                self.file_start = path, now
+                file_type = get_file_type(path)
+                self.file_type_counts[file_type] = (
+                    self.file_type_counts.get(file_type, 0) + 1
+                )
+
+    def finish(self):
+        from time import monotonic
+
+        self.finished = monotonic()
+        self.finish_linters(self.finished)
+
+    def finish_linters(self, now: float, linters: Optional[List[str]] = None):
+        self.finish_file(now)
+        for linter in list(self.linter_starts) if linters is None else linters:
+            self.linter_seconds[linter] = (
+                self.linter_seconds.get(linter, 0.0)
+                + now
+                - self.linter_starts.pop(linter)
+            )
+
+    def finish_file(self, now: float):
+        if self.file_start:
+            path, started = self.file_start
+            file_type = get_file_type(path)
+            self.file_type_seconds[file_type] = (
+                self.file_type_seconds.get(file_type, 0.0) + now - started
+            )
+            self.file_start = None
+
+
+def get_file_type(path: str) -> str:
+    """
+    Returns the file's extension, or its name if it has none (e.g.
+    Dockerfile).
+    """
+
+    from os.path import basename, splitext
+
+    return splitext(path)[1] or basename(path)
+
+
+def report_timings(timers: List[LintTimer], timings_path: Optional[str]):
+    """
+    Prints how long each linter and each type of file took, slowest first,
+    across the given timers (one per container), and optionally writes the
+    same as JSON.
+    """
+
+    from json import dump
+
+    linter_seconds: Dict[str, float] = {}
+    file_types: Dict[str, Dict[str, Any]] = {}
+    for timer in timers:
+        linter_seconds.update(timer.linter_seconds)  # disjoint across shards
+        for file_type, count in timer.file_type_counts.items():
+            totals = file_types.setdefault(
+                file_type, dict(files=0, seconds=0.0)
+            )
+            totals["files"] += count
+            totals["seconds"] += timer.file_type_seconds.get(file_type, 0.0)
+    wall_seconds = max(timer.finished - timer.started for timer in timers)
+
+    print()
+    if linter_seconds:
+        print(f"{'Linter':<32}{'Seconds':>9}")
+        for linter, seconds in sorted(
+            linter_seconds.items(), key=lambda item: item[1], reverse=True
+        ):
+            print(f"{linter:<32}{seconds:>9.1f}")
+    else:
+        print("No linters could be timed from Super-Linter's output.")
+
+    if file_types:
+        print()
+        print(f"{'File type':<32}{'Files':>7}{'Seconds':>9}")
+        for file_type, totals in sorted(
+            file_types.items(),
+            key=lambda item: item[1]["seconds"],
+            reverse=True,
+        ):
+            print(
+                f"{file_type:<32}{totals['files']:>7}{totals['seconds']:>9.1f}"
+            )
+
+    print()
+    print(f"Linting took {wall_seconds:.1f} seconds in all.")
+
+    if timings_path:
+        with open(timings_path, "w") as output:
+            dump(
+                dict(
+                    wall_seconds=wall_seconds,
+                    linters=linter_seconds,
+                    file_types=file_types,
+                ),
+                output,
+                indent=2,
+            )
+        print(f"Wrote timings to {timings_path}.")
+
+
+def get_changed_paths(codebase_path: str, ref: str) -> List[str]:
+    """
+    Returns paths under the codebase that were added or modified since it
+    diverged from the given ref, plus any untracked files, relative to it.
+    """
+
+    from subprocess import run
+
+    def git(*args: str) -> str:
+        return run(
+            ["git", "-C", codebase_path, *args],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout
+
+    # -z leaves paths unquoted, e.g. ones with non-ASCII characters
+    merge_base = git("merge-base", ref, "HEAD").strip()
+    return sorted(
+        {
+            *git(
+                "diff",
+                "-z",
+                "--name-only",
+                "--relative",
+                "--diff-filter=d",
+                merge_base,
+            ).split("\0"),
+            *git("ls-files", "-z", "--others", "--exclude-standard").split(
+                "\0"
+            ),
+        }
+        - {""}
+    )
+
+
+class ResultCache:
+    """
+    Remembers which linters passed each file's content under a given
+    context (see get_result_context_key), so that unchanged files need not
+    be linted again. As Super-Linter's per-file output varies between
+    versions, a file is only recorded as having passed its linters when the
+    whole run (or shard) that linted it did.
+    """
+
+    def __init__(self, path: str, context_key: str, codebase_path: str):
+        from json import load
+
+        self.path = path
+        self.context_key = context_key
+        self.codebase_path = codebase_path
+        self.file_hashes: Dict[str, str] = {}
+        self.hit_count = 0
+
+        try:
+            with open(path) as input:
+                cache = load(input)
+            self.passed: Dict[str, List[str]] = cache[context_key]
+        except (OSError, ValueError, KeyError):
+            self.passed = {}
+
+    def get_unpassed(self, paths: List[str], linters: List[str]) -> List[str]:
+        unpassed = [
+            path
+            for path in paths
+            if not set(linters).issubset(
+                self.passed.get(self.get_hash(path), [])
+            )
+        ]
+        self.hit_count = len(paths) - len(unpassed)
+        return unpassed
+
+    def add_passed(self, paths: List[str], linters: List[str]):
+        for path in paths:
+            file_hash = self.get_hash(path)
+            self.passed[file_hash] = sorted(
+                {*self.passed.get(file_hash, []), *linters}
+            )
+
+    def get_hash(self, path: str) -> str:
+        from hashlib import sha256
+        from os.path import join
+
+        if path not in self.file_hashes:
+            self.file_hashes[path] = get_file_hash(
+                sha256(), join(self.codebase_path, path)
+            ).hexdigest()
+        return self.file_hashes[path]
+
+    def save(self):
+        """
+        Writes out results for the current context only, so that results
+        for outdated configurations do not pile up.
+        """
+
+        from json import dump
+        from os import makedirs, replace
+        from os.path import dirname
+
+        makedirs(dirname(self.path), exist_ok=True)
+        with open(f"{self.path}.tmp", "w") as output:
+            dump({self.context_key: self.passed}, output)
+        replace(f"{self.path}.tmp", self.path)
+
+
+def get_result_context_key(
+    image: str,
+    codebase_path: str,
+    env: Dict[str, Any],
+    codebase_paths: List[str],
+) -> str:
+    """
+    Returns a hash of everything other than a file's content and linter
+    that could change whether it passes: the image, the environment, and
+    the linter configuration files in the codebase. Filters and which
+    linters are enabled are left out, as they only decide what gets linted.
+    """
+
+    from hashlib import sha256
+    from json import dumps
+    from os.path import join
+    from subprocess import run
+
+    try:
+        image_id = run(
+            ["docker", "image", "inspect", "--format={{.Id}}", image],
+            capture_output=True,
+            text=True,
+        ).stdout.strip()  # if not pulled yet, the tag will have to do for now
+    except FileNotFoundError:  # no docker here, e.g. only dry-running
+        image_id = ""
+    context_env = {
+        key: get_env_value_as_str(value)
+        for key, value in env.items()
+        if key != "FILTER_REGEX_INCLUDE"
+        and key.split("VALIDATE_", 1)[-1] not in LINTERS
+    }
+
+    context_hash = sha256(
+        dumps([image, image_id, context_env], sort_keys=True).encode("utf-8")
+    )
+    for path in get_config_paths(
+        codebase_path,
+        env.get("LINTER_RULES_PATH", DEFAULT_LINTER_RULES_PATH),
+        codebase_paths,
+    ):
+        context_hash.update(f"\0{path}\0".encode("utf-8"))
+        get_file_hash(context_hash, join(codebase_path, path))
+
+    return context_hash.hexdigest()
+
+
+def get_config_paths(
+    codebase_path: str,
+    rules_path: str,
+    codebase_paths: List[str],
+) -> List[str]:
+    """
+    Returns the linter configuration files in the codebase: everything in
+    its linter rules directory, plus dotfiles and well-known project files
+    at any level of the given codebase paths (see get_codebase_paths), as
+    linters look for configuration next to the files they lint, too.
+    """
+
+    from os import walk
+    from os.path import basename, join, relpath
+
+    paths = {
+        path
+        for path in codebase_paths
+        if basename(path).startswith(".") or basename(path) in CONFIG_NAMES
+    }
+    for directory, _, names in walk(join(codebase_path, rules_path)):
+        paths.update(
+            relpath(join(directory, name), codebase_path) for name in names
+        )
+
+    return sorted(paths)
+
+
+def get_file_hash(file_hash, path: str):
+    with open(path, "rb") as input:
+        while chunk := input.read(2**20):
+            file_hash.update(chunk)
+
+    return file_hash
+
+
+def get_paths_filter(paths: List[str], include_regex: Optional[str]) -> str:
+    """
+    Returns a FILTER_REGEX_INCLUDE matching only the given paths, either
+    relative to the codebase or as mounted in the container. Rather than
+    setting VALIDATE_ALL_CODEBASE=false, which has Super-Linter diff against
+    GitHub event metadata that local runs do not have, the paths are listed
+    outright. Any include filter the workflow already had is honoured by
+    dropping the paths it would not have matched.
+    """
+
+    # Escape for the POSIX extended regular expressions that Bash uses.
+    alternatives = "|".join(
+        "".join(
+            f"\\{char}" if char in ".[]{}()*+?^$|\\" else char for char in path
+        )
+        for path in get_included_paths(paths, include_regex)
+    )
+    return f"(^|{CODEBASE_MOUNT}/)({alternatives or '$^'})$"
+
+
+def get_included_paths(paths: List[str], include_regex: Optional[str]):
+    from re import search
+
+    return [
+        path
+        for path in paths
+        if not include_regex
+        or search(include_regex, path)
+        or search(include_regex, f"{CODEBASE_MOUNT}/{path}")
+    ]
+
+
+def get_codebase_paths(codebase_path: str) -> List[str]:
+    """
+    Returns the files in the codebase relative to it, leaving out those
+    Git ignores if it is in a repository.
+    """
+
+    from os import walk
+    from os.path import isfile, join, relpath
+    from subprocess import CalledProcessError, run
+
+    try:
+        paths = run(
+            [
+                *("git", "-C", codebase_path, "ls-files", "-z"),
+                *("--cached", "--others", "--exclude-standard"),
+            ],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.split(
+            "\0"
+        )  # -z leaves paths unquoted, e.g. non-ASCII ones
+    except (CalledProcessError, FileNotFoundError):  # not a repo or no Git
+        paths = []
+        for directory, directories, names in walk(codebase_path):
+            directories[:] = [name for name in directories if name != ".git"]
+            paths.extend(
+                relpath(join(directory, name), codebase_path) for name in names
+            )
+        return sorted(paths)
+    else:
+        return [
+            path
+            for path in paths
+            if path and isfile(join(codebase_path, path))
+        ]
 
 
 def get_env_value_as_str(value) -> str:
@@ -223,4 +1268,4 @@ def get_env_value_as_str(value) -> str:
 
 
 if __name__ == "__main__":
-    main()
+    exit(main())
@@ -0,0 +1,296 @@
+from contextlib import contextmanager
+from os import environ
+from threading import Lock
+from typing import Callable, List, Optional, TypedDict, cast
+
+# IAM roles always allow at least one hour, so when a token does have to
+# be requested, ask for an hour to increase the likelihood that a future
+# aws-as-role invocation will be able to re-use the token. The user can
+# push this higher with `--duration-seconds`, but otherwise use an hour.
+MIN_DURATION_REQUEST = 3600
+
+# When many aws-as-role processes miss the cache at once, one requests the
+# token while the rest wait on a lock for it, but only for so long: whoever
+# holds the lock might be waiting on somebody to enter an MFA code.
+LOCK_WAIT_SECONDS = 120
+
+# Fanning out resolves credentials on several threads, but only one of them
+# can usefully ask the user for an MFA code at a time.
+MFA_PROMPT_LOCK = Lock()
+
+
+class StsCredentials(TypedDict):
+    AccessKeyId: str
+    SecretAccessKey: str
+    SessionToken: str
+    Expiration: int
+
+
+def get_credential_caches(prog: str):
+    """
+    Returns dict-like objects for caching credentials on-disk, first the
+    given program's own (e.g. aws-as-role's) and then the AWS CLI's
+    `~/.aws/cli/cache/`. The program's own cache is the one kept by
+    aws-as-role --keep-fresh and relied upon by the cache hit fast path,
+    but checking the CLI's as well (and writing to both) means that one
+    assume-role call can serve both tools.
+
+    There's another way to cache credentials by overriding the `cache`
+    attribute on the `assume-role` provider of the `credential_provider`
+    component (see <https://github.com/boto/botocore/pull/1157>), but
+    that cannot be leveraged here because
+
+    - we are the ones doing the call to `assume_role()` rather than it
+      being called for us by another AWS service client, and
+    - we want to be able to inspect the `Expiration` value of what we
+      have cached to make sure the caller has the requisite time left.
+
+    Most invocations are cache hits, so reading from the cache must only
+    need the standard library; see also `test.sh`.
+    """
+
+    from os.path import expanduser, join
+
+    # same as appdirs' user_cache_dir(appname=prog) on Linux, which is all
+    # that importing appdirs would get us here
+    cache_home = environ.get("XDG_CACHE_HOME") or expanduser("~/.cache")
+    our_cache_dir = join(cache_home, prog)  # e.g. ~/.cache/aws-as-role/
+    cli_cache_dir = expanduser(join("~", ".aws", "cli", "cache"))
+    return [
+        CredentialCache(working_dir=our_cache_dir),
+        CliCredentialCache(working_dir=cli_cache_dir),
+    ]
+
+
+class CredentialCache:
+    """
+    Reads entries from a `botocore.utils.JSONFileCache` directory without
+    having to import botocore, which only gets imported when writing.
+    """
+
+    def __init__(self, working_dir: str):
+        self.working_dir = working_dir
+
+    def __getitem__(self, cache_key: str) -> StsCredentials:
+        return self.load(cache_key)
+
+    def __setitem__(self, cache_key: str, value: StsCredentials):
+        self.dump(cache_key, value)
+
+    def get_key(self, role_arn: str, serial_number: Optional[str]) -> str:
+        return get_cache_key(role_arn)
+
+    def load(self, cache_key: str):
+        from json import load
+        from os.path import join
+
+        try:
+            with open(join(self.working_dir, f"{cache_key}.json")) as input:
+                return load(input)
+        except (OSError, ValueError):
+            raise KeyError(cache_key)
+
+    def dump(self, cache_key: str, value):
+        from botocore.utils import JSONFileCache
+
+        JSONFileCache(working_dir=self.working_dir)[cache_key] = value
+
+    @contextmanager
+    def locked(self, cache_key: str, timeout: float = LOCK_WAIT_SECONDS):
+        """
+        Holds an exclusive lock on the cache key across processes, waiting
+        up to timeout seconds for it before carrying on without it.
+
+        The lock is an flock() on a `.lock` file next to the entry, which
+        the kernel releases whenever its holder exits, so locks left by
+        crashed processes never go stale even though the file remains.
+        """
+
+        from fcntl import LOCK_EX, LOCK_NB, LOCK_UN, flock
+        from os import makedirs
+        from os.path import join
+        from time import monotonic, sleep
+
+        makedirs(self.working_dir, exist_ok=True)
+        with open(join(self.working_dir, f"{cache_key}.lock"), "a") as lock:
+            give_up_at = monotonic() + timeout
+            while True:
+                try:
+                    flock(lock, LOCK_EX | LOCK_NB)
+                    is_locked = True
+                    break
+                except BlockingIOError:
+                    if monotonic() >= give_up_at:
+                        is_locked = False
+                        break
+                    sleep(0.1)
+
+            try:
+                yield
+            finally:
+                if is_locked:
+                    flock(lock, LOCK_UN)
+
+
+class CliCredentialCache(CredentialCache):
+    """
+    Reads and writes entries the way the AWS CLI's assume-role provider
+    does, i.e. whole AssumeRole responses with ISO 8601 expirations under
+    a hash of the request. Only entries for profiles with just role_arn
+    and (optionally) mfa_serial can be shared; duration_seconds,
+    external_id, or role_session_name settings change the hash.
+    """
+
+    def __getitem__(self, cache_key: str) -> StsCredentials:
+        try:
+            credentials = self.load(cache_key)["Credentials"]
+            expiration = get_timestamp(credentials["Expiration"])
+        except (KeyError, TypeError, ValueError):
+            raise KeyError(cache_key)
+
+        return cast(StsCredentials, dict(credentials, Expiration=expiration))
+
+    def __setitem__(self, cache_key: str, value: StsCredentials):
+        from datetime import datetime, timezone
+
+        expiration = datetime.fromtimestamp(value["Expiration"], timezone.utc)
+        credentials = dict(value, Expiration=expiration.isoformat())
+        self.dump(cache_key, dict(Credentials=credentials))
+
+    def get_key(self, role_arn: str, serial_number: Optional[str]) -> str:
+        from hashlib import sha1
+        from json import dumps
+
+        # same as botocore's AssumeRoleCredentialFetcher._create_cache_key()
+        # for a profile using the default (i.e. random) role session name
+        assume_role_args = dict(RoleArn=role_arn)
+        if serial_number:
+            assume_role_args.update(SerialNumber=serial_number)
+        args = dumps(assume_role_args, sort_keys=True)
+        return sha1(args.encode("utf-8")).hexdigest()
+
+
+def get_timestamp(value: str) -> float:
+    """
+    Parses expirations like the AWS CLI writes them, which depending on
+    its version might be "2020-01-01T00:00:00UTC" or ISO 8601 proper.
+    """
+
+    from datetime import datetime
+
+    for suffix in ["UTC", "Z"]:
+        if value.endswith(suffix):
+            value = value[: -len(suffix)] + "+00:00"
+
+    return datetime.fromisoformat(value).timestamp()
+
+
+def get_cache_key(role_arn: str):
+    from hashlib import sha1
+
+    return sha1(role_arn.encode("utf-8")).hexdigest()
+
+
+def get_role_credentials(
+    credential_caches: List[CredentialCache],
+    need_seconds: int,
+    profile: str,
+    role_arn: str,
+    session_name: str,
+    serial_number: str,
+    duration_seconds: int,
+    get_source_credentials: Optional[Callable[[], StsCredentials]] = None,
+):
+    """
+    Returns cached credentials for the role if they have at least the
+    needed number of seconds remaining or requests (and caches) fresh
+    ones from STS otherwise.
+
+    STS is called with the given profile's credentials, unless there is
+    a get_source_credentials callback (e.g. for the previous hop in a
+    chain of roles), which is only called if STS is actually needed.
+    """
+
+    from time import time
+
+    cache_keys = [
+        cache.get_key(role_arn, serial_number) for cache in credential_caches
+    ]
+    need_credentials_until = time() + need_seconds
+
+    def get_cached_credentials():
+        for credential_cache, cache_key in zip(credential_caches, cache_keys):
+            try:
+                credentials = credential_cache[cache_key]
+                assert need_credentials_until <= credentials["Expiration"]
+                return credentials
+            except (KeyError, AssertionError):
+                continue
+        raise KeyError(role_arn)
+
+    try:
+        return get_cached_credentials()
+    except KeyError:
+        pass
+
+    with credential_caches[0].locked(cache_keys[0]):
+        try:  # another process might have gotten them while we waited
+            return get_cached_credentials()
+        except KeyError:
+            credentials = get_credentials(
+                profile=profile,
+                role_arn=role_arn,
+                session_name=session_name,
+                serial_number=serial_number,
+                duration_seconds=max(duration_seconds, MIN_DURATION_REQUEST),
+                source_credentials=(
+                    get_source_credentials()
+                    if get_source_credentials
+                    else None
+                ),
+            )
+            for credential_cache, cache_key in zip(
+                credential_caches, cache_keys
+            ):
+                credential_cache[cache_key] = credentials
+            return credentials
+
+
+def get_credentials(
+    profile: str,
+    role_arn: str,
+    session_name: str,
+    serial_number: str,
+    duration_seconds: int,
+    source_credentials: Optional[StsCredentials] = None,
+):
+    from getpass import getpass
+
+    from boto3 import Session
+
+    session = (
+        Session(
+            aws_access_key_id=source_credentials["AccessKeyId"],
+            aws_secret_access_key=source_credentials["SecretAccessKey"],
+            aws_session_token=source_credentials["SessionToken"],
+        )
+        if source_credentials
+        else Session(profile_name=profile)
+    )
+    sts = session.client("sts")
+    assume_role_args = dict(
+        RoleArn=role_arn,
+        RoleSessionName=session_name,
+        DurationSeconds=duration_seconds,
+    )
+    if serial_number:
+        with MFA_PROMPT_LOCK:
+            mfa_code = getpass(f"Enter MFA code for {serial_number}: ")
+        assume_role_args.update(SerialNumber=serial_number, TokenCode=mfa_code)
+
+    response = sts.assume_role(**assume_role_args)
+    credentials = dict(
+        response["Credentials"],
+        Expiration=response["Credentials"]["Expiration"].timestamp(),
+    )
+    return cast(StsCredentials, credentials)
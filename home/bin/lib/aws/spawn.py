@@ -0,0 +1,111 @@
+from os import environ
+from threading import Lock
+from typing import Callable, Dict, List
+
+from lib.aws.credentials import StsCredentials
+
+
+def do_fan_out(
+    get_credentials_by_label: Dict[str, Callable[[], StsCredentials]],
+    command: List[str],
+    jobs: int,
+) -> int:
+    """
+    Runs the command once per label with that label's credentials, up to
+    the given number of jobs at once, and prints a summary of how each one
+    went. Returns a non-zero exit status if any of them failed.
+    """
+
+    from concurrent.futures import ThreadPoolExecutor
+    from subprocess import DEVNULL, PIPE, STDOUT, Popen
+    from sys import stderr, stdout
+
+    width = max(map(len, get_credentials_by_label))
+    output_lock = Lock()
+
+    def run_one(label: str, get_credentials: Callable[[], StsCredentials]):
+        try:
+            credentials = get_credentials()
+        except Exception as error:
+            with output_lock:
+                print(f"{label:>{width}} | {error}", file=stderr)
+            return "no credentials"
+
+        try:
+            process = Popen(
+                command,
+                env=get_spawn_environ(
+                    access_key_id=credentials["AccessKeyId"],
+                    secret_access_key=credentials["SecretAccessKey"],
+                    session_token=credentials["SessionToken"],
+                ),
+                stdin=DEVNULL,
+                stdout=PIPE,
+                stderr=STDOUT,
+                text=True,
+                errors="replace",
+            )
+        except OSError as error:  # e.g. no such command
+            with output_lock:
+                print(f"{label:>{width}} | {error}", file=stderr)
+            return "could not run"
+        assert process.stdout
+        for line in process.stdout:
+            with output_lock:
+                stdout.write(f"{label:>{width}} | {line}")
+                stdout.flush()
+
+        return process.wait()
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        futures = {
+            label: executor.submit(run_one, label, get_credentials)
+            for label, get_credentials in get_credentials_by_label.items()
+        }
+        results = {label: future.result() for label, future in futures.items()}
+
+    print(file=stderr)
+    for label, result in results.items():
+        outcome = f"exit {result}" if isinstance(result, int) else result
+        print(f"{label:>{width}} | {outcome}", file=stderr)
+
+    return 0 if all(result == 0 for result in results.values()) else 1
+
+
+def do_spawn(
+    access_key_id: str,
+    secret_access_key: str,
+    session_token: str,
+    command: List[str],
+):
+    from subprocess import run
+
+    new_environ = get_spawn_environ(
+        access_key_id=access_key_id,
+        secret_access_key=secret_access_key,
+        session_token=session_token,
+    )
+    run(command, env=new_environ)
+
+
+def get_spawn_environ(
+    access_key_id: str,
+    secret_access_key: str,
+    session_token: str,
+):
+    # copy current set of environment variables, but clear AWS_PROFILE if set
+    # so that the subprocess only sees the new credentials.
+    new_environ = dict(environ)
+    try:
+        del new_environ["AWS_PROFILE"]
+    except KeyError:
+        pass
+
+    # configure new credentials into environment
+    new_environ.update(
+        AWS_ACCESS_KEY_ID=access_key_id,
+        AWS_SECRET_ACCESS_KEY=secret_access_key,
+        AWS_SESSION_TOKEN=session_token,
+    )
+
+    return new_environ
@@ -7,54 +7,213 @@ like `find` or `xargs` to filter and sort through local save files.
 """
 
 
-from typing import List, NamedTuple, Optional
+from typing import (
+    BinaryIO,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
 
 
 class Settings(NamedTuple):
+    append: bool
+    cache_dir: Optional[str]
+    cache_size: int
+    dedupe: bool
+    dedupe_threshold: float
     ffmpeg_bin: str
     framerate: float
+    jobs: int
     scale_output: Optional[str]
+    shrink_above: float
     openttd_bin: str
+    personal_dir: str
     scroll_to: str
     zoom_to: int
     output_file: str
     save_files: List[str]
-    screenshot_naming: str
     screenshot_type: str
-    script_file: str
+    stream: bool
+    timings_file: Optional[str]
+
+
+class FrameTiming(NamedTuple):
+    save_file: str
+    cached: bool
+    load_seconds: float
+    capture_seconds: float
+    shrink_seconds: float
+    file_size: int
+
+
+class Timings(NamedTuple):
+    frames: Dict[int, FrameTiming]
+    stages: Dict[str, float]
+
+
+# Content that save files may need from the personal directory, which is
+# linked into each instance's own personal directory rather than copied.
+SHARED_CONTENT_DIRS = [
+    "ai",
+    "baseset",
+    "content_download",
+    "data",
+    "game",
+    "newgrf",
+]
+
+# Only these map-style types are drawn without the blitter, so they are the
+# only ones openttd can still save with the null video driver, whose null
+# blitter has no colour depth for the PNG writer; every other type, from the
+# screen-with-windows viewport to the whole-map world, needs a real driver.
+HEADLESS_SCREENSHOT_TYPES = {"heightmap", "industry", "minimap", "topography"}
+
+SCREENSHOT_NAME = "openttd-animate"
+
+# How many frames each instance may take before earlier ones are used up.
+FRAMES_AHEAD_PER_JOB = 2
+
+# Frames are shrunk towards --scale-output first if they are bigger than
+# this many megapixels, as ffmpeg would otherwise decode them whole.
+DEFAULT_SHRINK_ABOVE = 64.0
+
+# Sizes that ffmpeg -s takes by name besides WxH.
+SIZE_PRESETS = {
+    "ntsc": "720x480",
+    "pal": "720x576",
+    "film": "352x240",
+    "vga": "640x480",
+    "svga": "800x600",
+    "xga": "1024x768",
+    "hd480": "852x480",
+    "hd720": "1280x720",
+    "hd1080": "1920x1080",
+    "2k": "2048x1080",
+    "4k": "4096x2160",
+    "uhd2160": "3840x2160",
+}
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Bytes per pixel of 8-bit PNGs by color type: gray, RGB, palette index,
+# gray with alpha and RGB with alpha.
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+# How much image data to decompress at a time when shrinking frames.
+PNG_DECOMPRESS_SIZE = 2**22
+
+# How often to check whether openttd has started writing its screenshot.
+SCREENSHOT_POLL_SECONDS = 0.05
+
+# Width and height of the grayscale thumbnails compared to find frames that
+# look nearly the same.
+THUMBNAIL_SIZE = 128
 
 
 def main() -> int:
+    from os.path import abspath, isfile, join, splitext
+    from shutil import move
+    from sys import stderr
+    from tempfile import TemporaryDirectory
+    from time import monotonic
+
+    started = monotonic()
     settings = get_settings()
-    existent_script = get_file_content(settings.script_file)
-    screenshot_files = []
+    timings = Timings(frames={}, stages={})
+    manifest = get_manifest(settings) if settings.append else None
+    encoded_saves = set()
+    if settings.append and not manifest and isfile(settings.output_file):
+        print(
+            f"{settings.output_file} has no {get_manifest_file(settings)} "
+            "to show what went into it, so it cannot be appended to; move it "
+            "aside or leave off --append to make it again",
+            file=stderr,
+        )
+        return 1
+    elif manifest:
+        if manifest["settings"] != get_manifest_settings(settings):
+            print(
+                f"{get_manifest_file(settings)} shows {settings.output_file} "
+                f"was made with other settings: {manifest['settings']}",
+                file=stderr,
+            )
+            return 1
+        # a save is only already in the video if both where it came from and
+        # its content match, as e.g. a paused game saves the same content
+        # under new names, and autosaves reuse names for new content
+        encoded_saves = {
+            (abspath(save["path"]), save["key"]) for save in manifest["saves"]
+        }
 
-    try:
-        for i, save_file in enumerate(settings.save_files, 1):
-            screenshot_file = settings.screenshot_naming % i
-            our_script = make_script(settings, screenshot_file)
-            write_file_content(settings.script_file, our_script)
-            screenshot_files.append(screenshot_file)
-            launch_game(settings.openttd_bin, save_file)
-
-        generate_video(settings, settings.screenshot_naming)
-
-    finally:
-        if existent_script:
-            write_file_content(settings.script_file, existent_script)
+    save_keys: Dict[str, str] = {}
+    new_save_files = settings.save_files
+    if settings.append:
+        save_keys = {
+            save_file: get_frame_key(settings, save_file)
+            for save_file in settings.save_files
+        }
+        new_save_files = [
+            save_file
+            for save_file in settings.save_files
+            if (abspath(save_file), save_keys[save_file]) not in encoded_saves
+        ]
+        if not new_save_files:
+            print(f"{settings.output_file} already has every save file.")
+            return 0
+
+    with TemporaryDirectory(
+        prefix="openttd-animate-",
+        dir=settings.personal_dir,
+    ) as work_dir:
+        if manifest:
+            extension = splitext(settings.output_file)[1]
+            segment_file = join(work_dir, f"segment{extension}")
+            render_video(
+                settings._replace(
+                    output_file=segment_file,
+                    save_files=new_save_files,
+                ),
+                work_dir,
+                timings,
+            )
+            concat_started = monotonic()
+            appended_file = join(work_dir, f"appended{extension}")
+            concat_videos(
+                settings, [settings.output_file, segment_file], appended_file
+            )
+            move(appended_file, settings.output_file)
+            timings.stages["concat"] = monotonic() - concat_started
         else:
-            remove_file_path(settings.script_file)
+            render_video(settings, work_dir, timings)
+
+    if settings.append:
+        write_manifest(
+            settings,
+            [
+                *(manifest["saves"] if manifest else []),
+                *(
+                    dict(path=abspath(save_file), key=save_keys[save_file])
+                    for save_file in new_save_files
+                ),
+            ],
+        )
 
-        for screenshot_file in screenshot_files:
-            remove_file_path(screenshot_file)
+    if settings.cache_dir:  # e.g. after lowering --cache-size
+        evict_cached_frames(settings.cache_dir, settings.cache_size)
 
+    report_timings(settings, timings, monotonic() - started)
     return 0
 
 
 def get_settings() -> Settings:
     from argparse import ArgumentParser
-    from os import X_OK, access
-    from os.path import dirname, expanduser, isdir, join
+    from os import X_OK, access, cpu_count, environ
+    from os.path import expanduser, isdir, join
     from shutil import which
 
     assert isinstance(__doc__, str), "expecting module-level docstring"
@@ -87,21 +246,28 @@ def get_settings() -> Settings:
         default=openttd_bin_default,
     )
 
-    parser.add_argument(
-        "--scripts-dir",
-        help="openttd scripts path; default is ./scripts directory next to openttd binary",
-        required=False,
-    )
-
-    screenshots_dir_default = next(
-        filter(isdir, [expanduser("~/.local/share/openttd/screenshot")]),
+    personal_dir_default = next(
+        filter(isdir, [expanduser("~/.local/share/openttd")]),
         None,
     )
     parser.add_argument(
-        "--screenshots-dir",
-        help=f"screenshots directory path; {'detected %(default)s' if screenshots_dir_default else 'required'}",
-        required=False if screenshots_dir_default else True,
-        default=screenshots_dir_default,
+        "--personal-dir",
+        help=f"""
+            openttd personal directory path, whose config and content (e.g.
+            base sets and NewGRFs) are shared with each openttd instance;
+            {'detected %(default)s' if personal_dir_default else 'required'}
+        """,
+        required=False if personal_dir_default else True,
+        default=personal_dir_default,
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        help="""
+            number of openttd instances to take screenshots with at once, each
+            in its own temporary personal directory; default %(default)s
+        """,
+        default=min(4, cpu_count() or 1),
     )
 
     parser.add_argument(
@@ -140,6 +306,15 @@ def get_settings() -> Settings:
         help="video output file to write",
         required=True,
     )
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="""
+            add only save files not already in the output video onto its end,
+            as recorded in a manifest kept next to it (e.g. output.mp4.json)
+            and without encoding what is already there again
+        """,
+    )
     parser.add_argument(
         "--framerate",
         type=float,
@@ -151,41 +326,614 @@ def get_settings() -> Settings:
         type=str,
         help="scale output video resolution; can be a preset like ntsc or WxH",
     )
+    parser.add_argument(
+        "--shrink-above",
+        metavar="MEGAPIXELS",
+        type=float,
+        help="""
+            with --scale-output, first shrink screenshots bigger than this a
+            strip at a time (which needs numpy), so ffmpeg need not hold the
+            whole of each huge one in memory; 0 to never; default %(default)s
+        """,
+        default=DEFAULT_SHRINK_ABOVE,
+    )
+    cache_home = environ.get("XDG_CACHE_HOME") or expanduser("~/.cache")
+    parser.add_argument(
+        "--cache-dir",
+        help="""
+            where to keep screenshots for reuse by later runs, keyed by the
+            content of the save file along with --type, --zoom-to and
+            --scroll-to; default %(default)s
+        """,
+        default=join(cache_home, "openttd-animate"),
+    )
+    parser.add_argument(
+        "--cache-size",
+        metavar="MB",
+        type=int,
+        help="""
+            remove the least recently used screenshots from the cache whenever
+            it grows beyond this many megabytes, and never cache screenshots
+            bigger than that; default %(default)s
+        """,
+        default=1024,
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="neither use nor add to the screenshot cache",
+    )
+    parser.add_argument(
+        "--dedupe",
+        action="store_true",
+        help="""
+            encode each run of identical screenshots as one frame shown for
+            longer, rather than encoding every one of them
+        """,
+    )
+    parser.add_argument(
+        "--dedupe-threshold",
+        metavar="DIFFERENCE",
+        type=float,
+        help=f"""
+            like --dedupe, but also treat screenshots as identical when their
+            {THUMBNAIL_SIZE}x{THUMBNAIL_SIZE} grayscale thumbnails differ by
+            no more than this on average, out of 255; default %(default)s
+        """,
+        default=0.0,
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="""
+            pipe each screenshot into ffmpeg as soon as it is taken, rather than
+            keeping them all on disk until every one has been taken
+        """,
+    )
+    parser.add_argument(
+        "--timings-json",
+        metavar="timings.json",
+        help="""
+            besides printing a summary, write how long each stage took for
+            each save file, and overall, to this JSON file
+        """,
+    )
     parser.add_argument("first_save", metavar="first.sav")
     parser.add_argument("next_saves", metavar="next.sav", nargs="+")
 
     args = parser.parse_args()
-    scripts = args.scripts_dir or join(dirname(args.openttd_bin), "scripts")
-    screenshot_prefix = get_temp_file_prefix(args.screenshots_dir)
-    save_files = [args.first_save, *args.next_saves]
-    sequence_specifier = f"%0{len(str(len(save_files)))}d"
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.stream and (args.dedupe or args.dedupe_threshold > 0):
+        parser.error("--dedupe needs every screenshot, so cannot --stream")
+
     return Settings(
+        append=args.append,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        cache_size=args.cache_size * 2**20,
+        dedupe=args.dedupe or args.dedupe_threshold > 0,
+        dedupe_threshold=args.dedupe_threshold,
         ffmpeg_bin=args.ffmpeg_bin,
         framerate=args.framerate,
+        jobs=args.jobs,
         scroll_to=args.scroll_to,
         zoom_to=args.zoom_to,
         scale_output=args.scale_output,
+        shrink_above=args.shrink_above,
         openttd_bin=args.openttd_bin,
         output_file=args.output,
-        save_files=save_files,
-        screenshot_naming=f"{screenshot_prefix}{sequence_specifier}.png",
+        personal_dir=args.personal_dir,
+        save_files=[args.first_save, *args.next_saves],
         screenshot_type=args.type,
-        script_file=join(scripts, "game_start.scr"),
+        stream=args.stream,
+        timings_file=args.timings_json,
     )
 
 
-def get_file_content(path: str) -> Optional[str]:
-    try:
-        with open(path, "r") as input:
-            return input.read()
-    except FileNotFoundError:
+def get_frame_naming(settings: Settings, work_dir: str) -> str:
+    from os.path import join
+
+    sequence_specifier = f"%0{len(str(len(settings.save_files)))}d"
+    return join(work_dir, f"frame-{sequence_specifier}.png")
+
+
+def get_frames(
+    settings: Settings,
+    work_dir: str,
+    frame_naming: str,
+    frame_timings: Dict[int, FrameTiming],
+) -> Iterator[str]:
+    """
+    Takes a screenshot of each save file using up to settings.jobs openttd
+    instances at once, and yields the path of each as a numbered frame, in
+    the order of the save files, as soon as it and those before it are done.
+    Only a few frames are taken ahead of those yielded so far, so frames
+    that are used up as they come do not pile up on disk. Frames already in
+    the cache are taken from there instead, and new ones are added to it,
+    evicting others as they go so that it stays within --cache-size. Huge
+    frames are shrunk towards
+    --scale-output in a pool of processes (see shrink_frame). How long each
+    frame took is put in frame_timings by number.
+    """
+
+    from collections import deque
+    from concurrent.futures import (
+        Future,
+        ProcessPoolExecutor,
+        ThreadPoolExecutor,
+    )
+    from os import makedirs, replace, utime
+    from os.path import dirname, getsize, join
+    from queue import SimpleQueue
+    from threading import Lock
+    from time import monotonic
+
+    jobs = min(settings.jobs, len(settings.save_files))
+    eviction_lock = Lock()
+    instance_dirs: SimpleQueue[str] = SimpleQueue()
+    for number in range(1, jobs + 1):
+        instance_dirs.put(make_instance_dir(settings, work_dir, number))
+
+    def get_frame(number: int, save_file: str) -> str:
+        frame_file = frame_naming % number
+        seconds = get_screenshot(number, save_file, frame_file)
+
+        shrink_started = monotonic()
+        if shrink_size:
+            process_pool.submit(
+                shrink_frame,
+                frame_file,
+                *shrink_size,
+                min_pixels=int(settings.shrink_above * 10**6),
+            ).result()
+
+        load_seconds, capture_seconds = seconds or (0.0, 0.0)
+        frame_timings[number] = FrameTiming(
+            save_file=save_file,
+            cached=seconds is None,
+            load_seconds=load_seconds,
+            capture_seconds=capture_seconds,
+            shrink_seconds=monotonic() - shrink_started,
+            file_size=getsize(frame_file),
+        )
+        return frame_file
+
+    def get_screenshot(number: int, save_file: str, frame_file: str):
+        """
+        Returns how long openttd took to load the save file and capture
+        its screenshot, or None if the screenshot came from the cache.
+        """
+
+        cached_file = (
+            join(
+                settings.cache_dir, f"{get_frame_key(settings, save_file)}.png"
+            )
+            if settings.cache_dir
+            else None
+        )
+        if cached_file:
+            try:
+                utime(cached_file)  # so eviction goes by when last used
+                link_or_copy_file(cached_file, frame_file)
+                return None
+            except FileNotFoundError:
+                pass
+
+        instance_dir = instance_dirs.get()
+        try:
+            seconds = take_screenshot(
+                settings,
+                instance_dir,
+                save_file,
+                frame_file,
+            )
+        finally:
+            instance_dirs.put(instance_dir)
+
+        if cached_file and getsize(frame_file) <= settings.cache_size:
+            cache_dir = dirname(cached_file)
+            makedirs(cache_dir, exist_ok=True)
+            link_or_copy_file(frame_file, f"{cached_file}.{number}.tmp")
+            replace(f"{cached_file}.{number}.tmp", cached_file)
+            with eviction_lock:
+                evict_cached_frames(cache_dir, settings.cache_size)
+        return seconds
+
+    shrink_size = get_shrink_size(settings)
+    with ThreadPoolExecutor(max_workers=jobs) as executor, ProcessPoolExecutor(
+        max_workers=jobs
+    ) as process_pool:
+        pending: Deque[Future] = deque()
+        for number, save_file in enumerate(settings.save_files, 1):
+            if len(pending) >= FRAMES_AHEAD_PER_JOB * jobs:
+                yield pending.popleft().result()
+            pending.append(executor.submit(get_frame, number, save_file))
+        while pending:
+            yield pending.popleft().result()
+
+
+def get_shrink_size(settings: Settings) -> Optional[Tuple[int, int]]:
+    """
+    Returns the size that huge frames should be shrunk towards, if any.
+    """
+
+    from importlib.util import find_spec
+    from re import fullmatch
+    from sys import stderr
+
+    if not settings.scale_output or not settings.shrink_above:
+        return None
+
+    size = SIZE_PRESETS.get(settings.scale_output, settings.scale_output)
+    if not (match := fullmatch(r"(\d+)x(\d+)", size)):
+        print(f"Not shrinking frames for {size} first.", file=stderr)
+        return None
+    elif not find_spec("numpy"):
+        print("Not shrinking frames first, as numpy is missing.", file=stderr)
         return None
 
+    return int(match.group(1)), int(match.group(2))
+
+
+def shrink_frame(frame_file: str, width: int, height: int, min_pixels: int):
+    """
+    Shrinks a PNG frame of more than min_pixels by the largest whole factor
+    that keeps it at least width by height, averaging each square of pixels
+    into one, and leaves ffmpeg to scale it the rest of the way. Only a strip
+    of rows as tall as the factor is decoded at a time, so memory use stays
+    bounded however huge the frame is. Frames that are not 8-bit and
+    non-interlaced are left alone.
+    """
+
+    from itertools import chain
+    from os import replace
+
+    with open(frame_file, "rb") as input:
+        chunks = get_png_chunks(input)
+        header = get_png_header(chunks)
+        if not header:
+            return
+        frame_width, frame_height, color_type, palette, first_data = header
+        factor = min(frame_width // width, frame_height // height)
+        if frame_width * frame_height <= min_pixels or factor < 2:
+            return
+
+        channels = PNG_CHANNELS[color_type]
+        rows = get_png_rows(
+            chain([(b"IDAT", first_data)], chunks),
+            frame_width,
+            channels,
+        )
+        with open(f"{frame_file}.tmp", "wb") as output:
+            write_png(
+                output,
+                frame_width // factor,
+                frame_height // factor,
+                1 if color_type in (0, 4) else 3,  # gray or RGB, sans alpha
+                get_shrunk_rows(rows, factor, channels, palette),
+            )
+    replace(f"{frame_file}.tmp", frame_file)
+
+
+def get_png_chunks(input: BinaryIO) -> Iterator[Tuple[bytes, bytes]]:
+    from struct import unpack
+
+    if input.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+        return
+    while len(length_and_type := input.read(8)) == 8:
+        length, chunk_type = unpack(">I4s", length_and_type)
+        data = input.read(length)
+        input.read(4)  # CRC, leaving zlib to notice any corruption
+        yield chunk_type, data
+
+
+def get_png_header(chunks: Iterator[Tuple[bytes, bytes]]):
+    """
+    Reads chunks up to and including the first IDAT and returns the width,
+    height, color type, palette (if any) and first image data of PNGs that
+    shrink_frame can read.
+    """
+
+    from struct import unpack
+
+    header = palette = None
+    for chunk_type, data in chunks:
+        if chunk_type == b"IHDR":
+            header = unpack(">IIBBBBB", data)
+        elif chunk_type == b"PLTE":
+            palette = data
+        elif chunk_type == b"IDAT" and header:
+            width, height, bit_depth, color_type, _, _, interlace = header
+            if bit_depth == 8 and not interlace and color_type in PNG_CHANNELS:
+                return width, height, color_type, palette, data
+            break
+
+    return None
+
+
+def get_png_rows(
+    chunks: Iterable[Tuple[bytes, bytes]],
+    width: int,
+    channels: int,
+):
+    """
+    Yields each row of the image as a flat array of bytes, decompressing
+    only a little image data at a time and undoing each row's filter.
+    """
+
+    from zlib import decompressobj
+
+    import numpy
+
+    stride = 1 + width * channels
+    decompressor = decompressobj()
+    pending = bytearray()
+    row = numpy.zeros(width * channels, dtype=numpy.uint8)
+    for chunk_type, data in chunks:
+        if chunk_type != b"IDAT":
+            continue
+        while data:
+            pending += decompressor.decompress(data, PNG_DECOMPRESS_SIZE)
+            data = decompressor.unconsumed_tail
+            row_count = len(pending) // stride
+            for offset in range(0, row_count * stride, stride):
+                row = unfilter_png_row(
+                    pending[offset],
+                    numpy.frombuffer(
+                        pending, numpy.uint8, stride - 1, offset + 1
+                    ).copy(),
+                    row,
+                    channels,
+                )
+                yield row
+            del pending[: row_count * stride]
+
+
+def unfilter_png_row(filter_type: int, row, previous, channels: int):
+    """
+    Undoes a row's PNG filter. Sub and Up filters are undone for the whole
+    row at once, but Average and Paeth depend on each byte before them, so
+    those go byte by byte; fortunately, OpenTTD does not filter at all.
+    """
+
+    import numpy
+
+    if filter_type == 0:  # None
+        return row
+    elif filter_type == 1:  # Sub
+        return numpy.cumsum(
+            row.reshape(-1, channels), axis=0, dtype=numpy.uint8
+        ).reshape(-1)
+    elif filter_type == 2:  # Up
+        return row + previous
+
+    raw, prior = row.tolist(), previous.tolist()
+    for index in range(len(raw)):
+        left = raw[index - channels] if index >= channels else 0
+        if filter_type == 3:  # Average
+            raw[index] = (raw[index] + (left + prior[index]) // 2) & 0xFF
+            continue
+
+        upper_left = prior[index - channels] if index >= channels else 0
+        estimate = left + prior[index] - upper_left
+        left_distance = abs(estimate - left)
+        upper_distance = abs(estimate - prior[index])
+        upper_left_distance = abs(estimate - upper_left)
+        if (
+            left_distance <= upper_distance
+            and left_distance <= upper_left_distance
+        ):
+            predictor = left
+        elif upper_distance <= upper_left_distance:
+            predictor = prior[index]
+        else:
+            predictor = upper_left
+        raw[index] = (raw[index] + predictor) & 0xFF  # Paeth
+
+    return numpy.array(raw, dtype=numpy.uint8)
+
+
+def get_shrunk_rows(
+    rows: Iterator,
+    factor: int,
+    channels: int,
+    palette: Optional[bytes],
+):
+    """
+    Yields rows that each average a factor by factor square of pixels from
+    a strip of factor rows, dropping any alpha channel and leftover pixels.
+    """
+
+    import numpy
+
+    colors = (
+        numpy.frombuffer(palette, dtype=numpy.uint8).reshape(-1, 3)
+        if palette
+        else None
+    )
+    strip = None
+    for number, row in enumerate(rows, 1):
+        pixels = (
+            colors[row]
+            if colors is not None
+            else row.reshape(-1, channels)[:, : 1 if channels <= 2 else 3]
+        )
+        strip = (
+            pixels.astype(numpy.uint32) if strip is None else strip + pixels
+        )
+        if number % factor == 0:
+            shrunk_width = len(strip) // factor
+            sums = (
+                strip[: shrunk_width * factor]
+                .reshape(shrunk_width, factor, -1)
+                .sum(axis=1)
+            )
+            yield ((sums + factor**2 // 2) // factor**2).astype(numpy.uint8)
+            strip = None
+
+
+def write_png(
+    output: BinaryIO,
+    width: int,
+    height: int,
+    channels: int,
+    rows: Iterator,
+):
+    """
+    Writes rows of 8-bit gray or RGB pixels as an unfiltered PNG, a little
+    compressed data at a time.
+    """
+
+    from struct import pack
+    from zlib import compressobj, crc32
+
+    def write_chunk(chunk_type: bytes, data: bytes):
+        output.write(pack(">I", len(data)))
+        output.write(chunk_type + data)
+        output.write(pack(">I", crc32(chunk_type + data)))
+
+    output.write(PNG_SIGNATURE)
+    color_type = 0 if channels == 1 else 2
+    write_chunk(
+        b"IHDR", pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+    )
+    compressor = compressobj()
+    for row in rows:
+        if data := compressor.compress(b"\0" + row.tobytes()):
+            write_chunk(b"IDAT", data)
+    write_chunk(b"IDAT", compressor.flush())
+    write_chunk(b"IEND", b"")
+
 
-def get_temp_file_prefix(dir: str) -> str:
-    from tempfile import mktemp  # can't use file handle, so not `mkstemp`
+def get_frame_key(settings: Settings, save_file: str) -> str:
+    """
+    Returns a hash of the save file's content and of the settings that
+    change what its screenshot looks like.
+    """
 
-    return mktemp(dir=dir, prefix="openttd-animate-") + "-"
+    from hashlib import sha256
+
+    frame_hash = sha256(
+        repr(
+            (settings.screenshot_type, settings.zoom_to, settings.scroll_to)
+        ).encode("utf-8")
+    )
+    with open(save_file, "rb") as input:
+        while chunk := input.read(2**20):
+            frame_hash.update(chunk)
+
+    return frame_hash.hexdigest()
+
+
+def link_or_copy_file(source: str, destination: str):
+    from os import link
+    from shutil import copyfile
+
+    try:
+        link(source, destination)
+    except OSError:  # e.g. on another file system
+        copyfile(source, destination)
+
+
+def evict_cached_frames(cache_dir: str, max_size: int):
+    """
+    Removes the least recently used frames from the cache until it is no
+    bigger than max_size bytes.
+    """
+
+    from os import remove, scandir
+
+    frames = []
+    try:
+        for entry in scandir(cache_dir):
+            if entry.name.endswith(".png"):
+                stat = entry.stat()
+                frames.append((stat.st_mtime, stat.st_size, entry.path))
+    except FileNotFoundError:  # no cache yet, or evicted by another run
+        pass
+
+    size = sum(frame_size for _, frame_size, _ in frames)
+    for _, frame_size, path in sorted(frames):
+        if size <= max_size:
+            break
+        size -= frame_size
+        try:
+            remove(path)
+        except FileNotFoundError:  # evicted by another run
+            pass
+
+
+def make_instance_dir(settings: Settings, work_dir: str, number: int) -> str:
+    """
+    Makes a directory for one openttd instance to use as its XDG config and
+    data homes, so its scripts and screenshots are its own, starting from a
+    copy of the user's config and links to their content.
+    """
+
+    from os import environ, makedirs, symlink
+    from os.path import expanduser, isdir, isfile, join
+    from shutil import copyfile
+
+    instance_dir = join(work_dir, f"instance-{number}")
+    config_dir = join(instance_dir, "config", "openttd")
+    personal_dir = join(instance_dir, "data", "openttd")
+    for path in [
+        config_dir,
+        join(personal_dir, "scripts"),
+        join(personal_dir, "screenshot"),
+    ]:
+        makedirs(path)
+
+    config_home = environ.get("XDG_CONFIG_HOME") or expanduser("~/.config")
+    config_file = next(
+        filter(
+            isfile,
+            [
+                join(config_home, "openttd", "openttd.cfg"),
+                join(settings.personal_dir, "openttd.cfg"),
+            ],
+        ),
+        None,
+    )
+    if config_file:
+        copyfile(config_file, join(config_dir, "openttd.cfg"))
+
+    for name in SHARED_CONTENT_DIRS:
+        if isdir(join(settings.personal_dir, name)):
+            symlink(
+                join(settings.personal_dir, name), join(personal_dir, name)
+            )
+
+    return instance_dir
+
+
+def take_screenshot(
+    settings: Settings,
+    instance_dir: str,
+    save_file: str,
+    screenshot_file: str,
+) -> Tuple[float, float]:
+    from os import replace
+    from os.path import join
+
+    personal_dir = join(instance_dir, "data", "openttd")
+    our_script = make_script(settings, f"{SCREENSHOT_NAME}.png")
+    write_file_content(
+        join(personal_dir, "scripts", "game_start.scr"), our_script
+    )
+    instance_screenshot_file = join(
+        personal_dir, "screenshot", f"{SCREENSHOT_NAME}.png"
+    )
+    seconds = launch_game(
+        settings.openttd_bin,
+        save_file,
+        instance_dir,
+        settings.screenshot_type in HEADLESS_SCREENSHOT_TYPES,
+        instance_screenshot_file,
+    )
+    replace(instance_screenshot_file, screenshot_file)
+
+    return seconds
 
 
 def make_script(settings: Settings, screenshot_file: str) -> str:
@@ -213,18 +961,461 @@ def write_file_content(path: str, content: str):
         output.write(content)
 
 
-def launch_game(bin: str, save_file: str):
+def launch_game(
+    bin: str,
+    save_file: str,
+    instance_dir: str,
+    headless: bool,
+    screenshot_file: str,
+) -> Tuple[float, float]:
+    """
+    Runs openttd until its script exits it, then returns how long it took
+    to start writing the screenshot file, which is mostly loading the save
+    file, and how long it took after that, which is mostly rendering the
+    screenshot (as big ones are written out while being rendered).
+    """
+
+    from os import environ
+    from os.path import abspath, exists, join
+    from subprocess import CalledProcessError, Popen, TimeoutExpired
+    from time import monotonic
+
+    started = monotonic()
+    written = None
+    with Popen(
+        [
+            *(bin, "-x", "-g", abspath(save_file)),
+            *(["-v", "null"] if headless else []),
+            *("-s", "null", "-m", "null"),  # no sound or music
+        ],
+        env={
+            **environ,
+            "XDG_CONFIG_HOME": join(instance_dir, "config"),
+            "XDG_DATA_HOME": join(instance_dir, "data"),
+        },
+    ) as process:
+        while written is None:
+            if exists(screenshot_file):
+                written = monotonic()
+            try:
+                process.wait(timeout=SCREENSHOT_POLL_SECONDS)
+                break
+            except TimeoutExpired:
+                pass
+    if process.returncode:
+        raise CalledProcessError(process.returncode, process.args)
+
+    finished = monotonic()
+    written = written or finished
+    return written - started, finished - written
+
+
+def render_video(settings: Settings, work_dir: str, timings: Timings):
+    """
+    Takes screenshots and encodes them, reporting progress as they come in
+    and putting how long each stage took in timings. Encoding overlaps
+    with taking screenshots when streaming, so only the time it took after
+    the last screenshot is counted for it.
+    """
+
+    from time import monotonic
+
+    started = monotonic()
+    frame_naming = get_frame_naming(settings, work_dir)
+    frame_files = get_progress_frames(
+        settings,
+        get_frames(settings, work_dir, frame_naming, timings.frames),
+        timings,
+    )
+    if settings.stream:
+        stream_video(settings, frame_files)
+    elif settings.dedupe:
+        frames = list(frame_files)
+        dedupe_started = monotonic()
+        frame_runs = get_frame_runs(settings, frames)
+        timings.stages["dedupe"] = monotonic() - dedupe_started
+        print(
+            f"Showing {len(frame_runs)} distinct frame(s) for longer in place "
+            f"of {len(settings.save_files) - len(frame_runs)} duplicate(s)."
+        )
+        generate_deduped_video(settings, frame_runs, work_dir)
+    else:
+        list(frame_files)  # wait for all
+        generate_video(settings, frame_naming)
+
+    timings.stages["encode"] = (
+        monotonic()
+        - started
+        - timings.stages["screenshots"]
+        - timings.stages.get("dedupe", 0.0)
+    )
+
+
+def get_progress_frames(
+    settings: Settings,
+    frame_files: Iterator[str],
+    timings: Timings,
+) -> Iterator[str]:
+    """
+    Passes frames along while showing how many have come in so far and
+    about how much longer the rest will take, then puts how long they all
+    took in timings.
+    """
+
+    from sys import stderr
+    from time import monotonic
+
+    started = monotonic()
+    count = len(settings.save_files)
+    end = "\r" if stderr.isatty() else "\n"
+    for number, frame_file in enumerate(frame_files, 1):
+        elapsed = monotonic() - started
+        print(
+            f"Screenshot {number}/{count} ({number / count:.0%}) after "
+            f"{get_duration_text(elapsed)}, about "
+            f"{get_duration_text(elapsed / number * (count - number))} left",
+            end=end,
+            file=stderr,
+            flush=True,
+        )
+        yield frame_file
+
+    if end == "\r":
+        print(file=stderr)
+    timings.stages["screenshots"] = monotonic() - started
+
+
+def get_duration_text(seconds: float) -> str:
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+
+    return (
+        f"{hours}h{minutes:02}m{seconds:02}s"
+        if hours
+        else f"{minutes}m{seconds:02}s" if minutes else f"{seconds}s"
+    )
+
+
+def report_timings(settings: Settings, timings: Timings, seconds: float):
+    """
+    Prints a summary of how long each stage took, and optionally writes
+    the details for each frame as JSON.
+    """
+
+    from json import dump
+    from sys import stderr
+
+    frames = [timings.frames[number] for number in sorted(timings.frames)]
+    taken = [frame for frame in frames if not frame.cached]
+
+    def get_average(values: Iterable[float]) -> float:
+        values = list(values)
+        return sum(values) / len(values) if values else 0.0
+
+    later_stages = ", ".join(
+        f"{get_duration_text(timings.stages[stage])} {doing}"
+        for stage, doing in [
+            ("dedupe", "deduplicating"),
+            ("encode", "encoding"),
+            ("concat", "appending"),
+        ]
+        if stage in timings.stages
+    )
+    print(
+        f"Took {get_duration_text(seconds)} in all, "
+        f"{get_duration_text(timings.stages.get('screenshots', 0.0))} for "
+        f"{len(frames)} screenshot(s) ({len(frames) - len(taken)} cached), "
+        f"then {later_stages}.",
+        file=stderr,
+    )
+    if taken:
+        print(
+            "On average, loading took "
+            f"{get_average(frame.load_seconds for frame in taken):.1f}s "
+            "and capturing took "
+            f"{get_average(frame.capture_seconds for frame in taken):.1f}s.",
+            file=stderr,
+        )
+    if frames:
+        print(
+            "On average, shrinking took "
+            f"{get_average(frame.shrink_seconds for frame in frames):.1f}s "
+            "for frames of "
+            f"{get_average(frame.file_size for frame in frames) / 2**20:.1f}"
+            " MB.",
+            file=stderr,
+        )
+
+    if settings.timings_file:
+        with open(settings.timings_file, "w") as output:
+            dump(
+                dict(
+                    seconds=seconds,
+                    stages=timings.stages,
+                    frames=[frame._asdict() for frame in frames],
+                ),
+                output,
+                indent=2,
+            )
+
+
+def get_frame_runs(settings: Settings, frame_files: List[str]):
+    """
+    Returns the first of each run of frames that look the same, with how
+    many frames are in the run. Frames look the same if their files are the
+    same, or with a dedupe threshold, if the mean difference between their
+    grayscale thumbnails is no more than it.
+    """
+
+    from concurrent.futures import ThreadPoolExecutor
+    from functools import partial
+
+    with ThreadPoolExecutor(max_workers=settings.jobs) as executor:
+        signatures = list(
+            executor.map(partial(get_frame_signature, settings), frame_files)
+        )
+
+    runs: List[Tuple[str, int]] = []
+    run_signature: Tuple[str, Optional[bytes]] = ("", None)
+    for frame_file, signature in zip(frame_files, signatures):
+        if runs and is_same_frame(settings, run_signature, signature):
+            runs[-1] = runs[-1][0], runs[-1][1] + 1
+        else:
+            runs.append((frame_file, 1))
+            run_signature = signature
+
+    return runs
+
+
+def get_frame_signature(settings: Settings, frame_file: str):
+    """
+    Returns a hash of the frame's file and, with a dedupe threshold, a small
+    grayscale thumbnail of it as raw bytes.
+    """
+
+    from hashlib import sha256
+    from subprocess import run
+
+    frame_hash = sha256()
+    with open(frame_file, "rb") as input:
+        while chunk := input.read(2**20):
+            frame_hash.update(chunk)
+
+    thumbnail = None
+    if settings.dedupe_threshold:
+        thumbnail = run(
+            [
+                *(settings.ffmpeg_bin, "-v", "error", "-i", frame_file),
+                *(
+                    "-vf",
+                    f"scale={THUMBNAIL_SIZE}:{THUMBNAIL_SIZE},format=gray",
+                ),
+                *("-f", "rawvideo", "-"),
+            ],
+            capture_output=True,
+            check=True,
+        ).stdout
+
+    return frame_hash.hexdigest(), thumbnail
+
+
+def is_same_frame(
+    settings: Settings,
+    signature: Tuple[str, Optional[bytes]],
+    other_signature: Tuple[str, Optional[bytes]],
+) -> bool:
+    from operator import sub
+
+    (frame_hash, thumbnail), (other_hash, other_thumbnail) = (
+        signature,
+        other_signature,
+    )
+    if frame_hash == other_hash:
+        return True
+    elif not thumbnail or not other_thumbnail:
+        return False
+
+    difference = sum(map(abs, map(sub, thumbnail, other_thumbnail)))
+    return difference / len(thumbnail) <= settings.dedupe_threshold
+
+
+def generate_deduped_video(
+    settings: Settings,
+    frame_runs: List[Tuple[str, int]],
+    work_dir: str,
+):
+    """
+    Encodes each distinct frame once, shown for as many seconds as there
+    were frames like it, using a list for ffmpeg's concat demuxer.
+    """
+
+    from os.path import basename, join
     from subprocess import run
 
-    run([bin, "-x", "-g", save_file], check=True)
+    list_file = join(work_dir, "frames.ffconcat")
+    last_frame_file = frame_runs[-1][0]
+    write_file_content(
+        list_file,
+        "ffconcat version 1.0\n"
+        + "".join(
+            f"file '{basename(frame_file)}'\nduration {count}\n"
+            for frame_file, count in frame_runs
+        )
+        + f"file '{basename(last_frame_file)}'\n",  # so its duration is used
+    )
+    run(
+        [
+            settings.ffmpeg_bin,
+            *get_video_args(
+                settings,
+                ["-f", "concat", "-safe", "0", "-i", list_file],
+                has_durations=True,
+            ),
+        ],
+        check=True,
+    )
 
 
 def generate_video(settings: Settings, screenshot_naming: str):
     from subprocess import run
 
-    args = [  # see https://trac.ffmpeg.org/wiki/Slideshow
-        *["-r", "1"],  # framerate for the _input_ files
-        *["-i", screenshot_naming],
+    run(
+        [
+            settings.ffmpeg_bin,
+            *get_video_args(settings, ["-i", screenshot_naming]),
+        ],
+        check=True,
+    )
+
+
+def stream_video(settings: Settings, frame_files: Iterator[str]):
+    """
+    Feeds each frame to ffmpeg as soon as it is taken, so encoding overlaps
+    with taking screenshots and each frame can be removed straight away.
+    """
+
+    from os import remove
+    from shutil import copyfileobj
+    from subprocess import PIPE, CalledProcessError, Popen
+
+    args = get_video_args(
+        settings,
+        ["-f", "image2pipe", "-c:v", "png", "-i", "-"],
+    )
+    with Popen(
+        [settings.ffmpeg_bin, "-nostdin", *args],  # stdin is for frames only
+        stdin=PIPE,
+    ) as process:
+        assert process.stdin
+        try:
+            for frame_file in frame_files:
+                with open(frame_file, "rb") as input:
+                    copyfileobj(input, process.stdin)
+                remove(frame_file)
+        except BaseException:
+            process.kill()  # rather than encode a video missing frames
+            raise
+        finally:
+            process.stdin.close()
+
+    if process.returncode:
+        raise CalledProcessError(process.returncode, process.args)
+
+
+def concat_videos(
+    settings: Settings, video_files: List[str], output_file: str
+):
+    """
+    Joins videos encoded the same way one after another without encoding
+    them again, using ffmpeg's concat demuxer.
+    """
+
+    from os.path import abspath
+    from subprocess import run
+
+    list_file = f"{output_file}.txt"
+    write_file_content(
+        list_file,
+        "".join(
+            "file '{}'\n".format(abspath(path).replace("'", "'\\''"))
+            for path in video_files
+        ),
+    )
+    run(
+        [
+            settings.ffmpeg_bin,
+            *("-f", "concat", "-safe", "0", "-i", list_file),
+            *("-c", "copy", output_file),
+        ],
+        check=True,
+    )
+
+
+def get_manifest_file(settings: Settings) -> str:
+    return f"{settings.output_file}.json"
+
+
+def get_manifest(settings: Settings) -> Optional[dict]:
+    """
+    Returns what the manifest next to the output file says went into it, if
+    both exist.
+    """
+
+    from json import load
+    from os.path import isfile
+
+    if not isfile(settings.output_file):
+        return None
+    try:
+        with open(get_manifest_file(settings)) as input:
+            return load(input)
+    except FileNotFoundError:
+        return None
+
+
+def get_manifest_settings(settings: Settings) -> dict:
+    """
+    Returns the settings that must not change for a video to be appended to,
+    as the frames would otherwise not match.
+    """
+
+    return dict(
+        framerate=settings.framerate,
+        scale_output=settings.scale_output,
+        screenshot_type=settings.screenshot_type,
+        scroll_to=settings.scroll_to,
+        zoom_to=settings.zoom_to,
+    )
+
+
+def write_manifest(settings: Settings, saves: List[dict]):
+    from json import dump
+    from os import replace
+
+    manifest_file = get_manifest_file(settings)
+    with open(f"{manifest_file}.tmp", "w") as output:
+        dump(
+            dict(settings=get_manifest_settings(settings), saves=saves),
+            output,
+            indent=2,
+        )
+    replace(f"{manifest_file}.tmp", manifest_file)
+
+
+def get_video_args(
+    settings: Settings,
+    input_args: List[str],
+    has_durations: bool = False,
+) -> List[str]:
+    """
+    Returns ffmpeg arguments for encoding the given input, which shows each
+    frame for a second unless has_durations says it gives its own.
+    """
+
+    return [  # see https://trac.ffmpeg.org/wiki/Slideshow
+        # framerate for the _input_ files, unless they have durations
+        *([] if has_durations else ["-r", "1"]),
+        *input_args,
         *["-r", str(settings.framerate)],  # framerate for the _output_ file
         *(
             ["-s", settings.scale_output]
@@ -236,17 +1427,17 @@ def generate_video(settings: Settings, screenshot_naming: str):
         ),
         *["-c:v", "libx264"],  # video codec
         "-an",  # no audio on output
-        *["-vsync", "cfr"],  # frames duplicated/dropped to achive framerate
+        *(
+            ["-vsync", "vfr"]  # frames keep their durations, not duplicated
+            if has_durations
+            else [
+                "-vsync",
+                "cfr",
+            ]  # frames duplicated/dropped to achive framerate
+        ),
         *["-pix_fmt", "yuv420p"],  # better compatibility
         settings.output_file,
     ]
-    run([settings.ffmpeg_bin, *args])
-
-
-def remove_file_path(path: str):
-    from os import unlink
-
-    unlink(path)
 
 
 if __name__ == "__main__":
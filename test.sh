@@ -30,6 +30,31 @@ aws-as-profile -h | grep -q '^usage: aws-as-profile '
 gh-super-linter --help | grep -q '^usage: gh-super-linter '
 git whoami | grep --quiet --fixed-strings dave@corpulent
 
+(
+  # Most aws-as-role invocations are cache hits, which should only need the
+  # standard library; check that nothing heavier gets imported for them, and
+  # report how long the imports took as a rough benchmark.
+  XDG_CACHE_HOME=$(mktemp --directory)
+  export XDG_CACHE_HOME
+  roleArn='arn:aws:iam::123456789012:role/aws-as-role-test'
+  cacheKey=$(echo -n "$roleArn" | sha1sum | cut -d' ' -f1)
+  mkdir "$XDG_CACHE_HOME/aws-as-role"
+  echo '{"AccessKeyId": "A", "SecretAccessKey": "S", "SessionToken": "T",' \
+    '"Expiration": 9999999999}' >"$XDG_CACHE_HOME/aws-as-role/$cacheKey.json"
+
+  imports=$(
+    python3 -X importtime "$(command -v aws-as-role)" \
+      --role-arn "$roleArn" -- true 2>&1 >/dev/null
+  )
+  rm -r "$XDG_CACHE_HOME"
+  if grep -E '\| +(appdirs|boto3|botocore)(\.|$)' <<<"$imports"; then
+    exit 1
+  fi
+  awk -F'|' '{ sub(/^import time: */, "", $1); total += $1 }
+    END { print "aws-as-role cache hit imports took " total " us" }' \
+    <<<"$imports"
+)
+
 (
   # This relies on `aws_completer` ignoring user aliases. If that changes (which
   # would be great!), then this test won't work anymore as written.